@@ -0,0 +1,84 @@
+""" Run many document searches against one collection concurrently.
+
+    Each `SearchQuery` may combine search text, an embedding and a metadata
+    filter, as `DocumentCollection.search` does. `asearch_many` runs the
+    queries over the collection's pooled async client, at most
+    `concurrency` at a time, and returns each query's results in query
+    order. `merge_top_k` merges result lists into the k best-scoring
+    documents with a heap, optionally keeping each document uuid once, so
+    that for example several rewrites of one question can be searched
+    together and fused into a single result list.
+
+    results = search_many(collection, [SearchQuery(text=q) for q in queries])
+    best = merge_top_k(results, k=5)
+"""
+import asyncio
+import heapq
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from event_loop import run_sync
+
+from zep_python.document import Document, DocumentCollection
+
+
+@dataclass
+class SearchQuery:
+    text: Optional[str] = None
+    embedding: Optional[List[float]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    limit: Optional[int] = 10
+
+
+async def asearch_many(
+    collection: DocumentCollection,
+    queries: Sequence[SearchQuery],
+    concurrency: int = 8,
+) -> List[List[Document]]:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def search(query: SearchQuery) -> List[Document]:
+        async with slots:
+            return await collection.asearch(
+                text=query.text,
+                embedding=query.embedding,
+                metadata=query.metadata,
+                limit=query.limit,
+            )
+
+    return await asyncio.gather(*(search(query) for query in queries))
+
+
+def search_many(
+    collection: DocumentCollection,
+    queries: Sequence[SearchQuery],
+    concurrency: int = 8,
+) -> List[List[Document]]:
+    return run_sync(asearch_many(collection, queries, concurrency))
+
+
+def merge_top_k(
+    results: Iterable[List[Document]], k: int, dedupe: bool = True
+) -> List[Document]:
+    """The k highest-scoring documents across result lists.
+
+    With `dedupe`, a document found by several queries appears once, with
+    its best score. Documents without a score rank last.
+    """
+
+    def score(document: Document) -> float:
+        return document.score if document.score is not None else float("-inf")
+
+    ranked = [sorted(r, key=score, reverse=True) for r in results]
+    merged = []
+    seen = set()
+    for document in heapq.merge(*ranked, key=score, reverse=True):
+        if dedupe:
+            key = document.uuid or id(document)
+            if key in seen:
+                continue
+            seen.add(key)
+        merged.append(document)
+        if len(merged) == k:
+            break
+    return merged
@@ -0,0 +1,201 @@
+""" Wait for document collections to finish embedding.
+
+    A `CollectionWaiter` watches any number of collections with one
+    `alist_collections` call per tick, however many are being watched.
+    Each collection is rechecked on its own schedule. While its
+    `document_embedded_count` is rising, the next check is timed for when
+    the remaining documents should be done at the observed rate; while it
+    is not, the interval doubles, up to `max_interval`.
+
+    `watch` returns a future that resolves to the ready collection, or
+    fails with `asyncio.TimeoutError` once `timeout` seconds pass.
+
+    waiter = CollectionWaiter(client)
+    collections = await waiter.wait(["docs_a", "docs_b"], timeout=600)
+
+    `wait_until_ready` does the same from sync code.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from event_loop import run_sync
+
+from zep_python import ZepClient
+from zep_python.document import DocumentCollection
+
+ProgressCallback = Callable[[DocumentCollection], None]
+
+
+def print_progress(collection: DocumentCollection):
+    print(
+        f"Embedding status ({collection.name}): "
+        f"{collection.document_embedded_count}/{collection.document_count}"
+        " documents embedded"
+    )
+
+
+@dataclass(eq=False)
+class _Watch:
+    name: str
+    future: asyncio.Future
+    deadline: Optional[float]
+    callback: Optional[ProgressCallback]
+    interval: float
+    next_check: float
+    embedded: Optional[int] = None
+    checked: Optional[float] = None
+
+
+class CollectionWaiter:
+    def __init__(
+        self,
+        client: ZepClient,
+        min_interval: float = 0.2,
+        max_interval: float = 10.0,
+        max_errors: int = 5,
+        on_progress: Optional[ProgressCallback] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+        self.on_progress = on_progress
+        self.clock = clock
+        self.polls = 0
+        self._watches: List[_Watch] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(
+        self,
+        name: str,
+        timeout: Optional[float] = None,
+        callback: Optional[ProgressCallback] = None,
+    ) -> asyncio.Future:
+        """A future for the collection once it is ready.
+
+        `callback`, if given, is called with the ready collection.
+        """
+        loop = asyncio.get_running_loop()
+        now = self.clock()
+        self._watches.append(
+            _Watch(
+                name=name,
+                future=loop.create_future(),
+                deadline=None if timeout is None else now + timeout,
+                callback=callback,
+                interval=self.min_interval,
+                next_check=now,
+            )
+        )
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._poll())
+        self._wakeup.set()
+        return self._watches[-1].future
+
+    async def wait(
+        self, names: Sequence[str], timeout: Optional[float] = None
+    ) -> Dict[str, DocumentCollection]:
+        futures = [self.watch(name, timeout) for name in names]
+        return dict(zip(names, await asyncio.gather(*futures)))
+
+    async def _poll(self):
+        errors = 0
+        while self._watches:
+            now = self.clock()
+            wake = min(
+                min(w.next_check for w in self._watches),
+                min(
+                    (w.deadline for w in self._watches if w.deadline is not None),
+                    default=float("inf"),
+                ),
+            )
+            if wake > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wake - now)
+                except asyncio.TimeoutError:
+                    pass
+                self._prune()
+                continue
+
+            if any(w.next_check <= now for w in self._watches):
+                try:
+                    collections = await self.client.document.alist_collections()
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    if errors >= self.max_errors:
+                        for w in self._watches:
+                            if not w.future.done():
+                                w.future.set_exception(e)
+                        self._prune()
+                        return
+                    collections = None
+                self.polls += 1
+                now = self.clock()
+                by_name = {c.name: c for c in collections or []}
+                for w in self._watches:
+                    if collections is None:
+                        self._back_off(w, now)
+                    else:
+                        self._update(w, by_name.get(w.name), now)
+
+            for w in self._watches:
+                if w.deadline is not None and now >= w.deadline:
+                    if not w.future.done():
+                        w.future.set_exception(
+                            asyncio.TimeoutError(
+                                f"Collection {w.name} was not ready in time"
+                            )
+                        )
+            self._prune()
+
+    def _update(self, w: _Watch, collection: Optional[DocumentCollection], now: float):
+        if collection is None:
+            # not created yet, or not listed yet
+            self._back_off(w, now)
+            return
+        if collection.status == "ready":
+            if not w.future.done():
+                w.future.set_result(collection)
+                if w.callback is not None:
+                    w.callback(collection)
+            return
+        if self.on_progress is not None:
+            self.on_progress(collection)
+        embedded = collection.document_embedded_count or 0
+        if w.embedded is not None and embedded > w.embedded:
+            rate = (embedded - w.embedded) / max(now - w.checked, 1e-6)
+            remaining = (collection.document_count or 0) - embedded
+            w.interval = min(
+                max(remaining / rate, self.min_interval), self.max_interval
+            )
+            w.next_check = now + w.interval
+        else:
+            self._back_off(w, now)
+        w.embedded, w.checked = embedded, now
+
+    def _back_off(self, w: _Watch, now: float):
+        w.interval = min(w.interval * 2, self.max_interval)
+        w.next_check = now + w.interval
+
+    def _prune(self):
+        # resolved, timed out, or cancelled by the caller
+        self._watches = [w for w in self._watches if not w.future.done()]
+
+
+def wait_until_ready(
+    client: ZepClient,
+    names: Sequence[str],
+    timeout: Optional[float] = None,
+    on_progress: Optional[ProgressCallback] = print_progress,
+) -> Dict[str, DocumentCollection]:
+    async def wait():
+        waiter = CollectionWaiter(client, on_progress=on_progress)
+        return await waiter.wait(names, timeout)
+
+    return run_sync(wait())
@@ -0,0 +1,180 @@
+""" Ingest a directory tree of text files into a Zep collection.
+
+    Files are split into byte ranges, and the ranges sharded across a
+    process pool. Each worker chunks its range with text_chunker, normalizes
+    the chunks to Unicode NFC and content-hashes them, and returns that
+    range's Documents, so no worker result is larger than a range however
+    large the file. Results are consumed in sorted path and range order,
+    whatever order the workers finish in, so the same corpus always
+    produces the same Documents. Only a bounded number of ranges is in
+    flight at once, and the Documents are streamed straight into the
+    uploader.
+
+    python corpus.py ./corpus --processes 32 --chunk-size 500
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from document_uploader import upload_documents
+from text_chunker import chunk_file
+
+from zep_python import ZepClient
+from zep_python.document import Document
+
+DEFAULT_SUFFIXES = (".txt", ".md")
+RANGE_SIZE = 4 << 20
+
+
+def walk_corpus(root: str, suffixes: Sequence[str] = DEFAULT_SUFFIXES) -> List[str]:
+    """Paths of the corpus files under root, relative to it and sorted."""
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.endswith(tuple(suffixes)):
+                path = os.path.join(directory, name)
+                paths.append(os.path.relpath(path, root))
+    return paths
+
+
+def file_ranges(
+    path: str, range_size: int = RANGE_SIZE
+) -> List[Tuple[int, Optional[int]]]:
+    """(start, end) byte ranges covering the file; the last one is open."""
+    starts = range(0, max(os.path.getsize(path), 1), range_size)
+    return [(start, start + range_size) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+def hash_file(root: str, path: str) -> str:
+    """Runs in a worker process."""
+    file_hash = hashlib.sha256()
+    with open(os.path.join(root, path), "rb") as f:
+        while block := f.read(1 << 20):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def chunk_document_range(
+    root: str,
+    path: str,
+    start: int,
+    end: Optional[int],
+    max_chunk_size: int,
+    overlap: int,
+) -> List[Document]:
+    """Runs in a worker process."""
+    documents = []
+    for chunk in chunk_file(
+        os.path.join(root, path), max_chunk_size, overlap, start=start, end=end
+    ):
+        chunk = unicodedata.normalize("NFC", chunk)
+        digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+        documents.append(
+            Document(content=chunk, metadata={"source": path, "content_hash": digest})
+        )
+    return documents
+
+
+def corpus_documents(
+    root: str,
+    max_chunk_size: int = 500,
+    overlap: int = 0,
+    processes: Optional[int] = None,
+    suffixes: Sequence[str] = DEFAULT_SUFFIXES,
+    range_size: int = RANGE_SIZE,
+) -> Iterator[Document]:
+    """Documents for every file under root, in a deterministic order."""
+    paths = walk_corpus(root, suffixes)
+    processes = processes or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(processes) as pool:
+        # submit ahead so every worker stays busy, but not the whole corpus
+        in_flight = deque()
+        for path in paths:
+            file_hash = pool.submit(hash_file, root, path)
+            # chunks are numbered per file, across its ranges
+            chunks = itertools.count()
+            for start, end in file_ranges(os.path.join(root, path), range_size):
+                in_flight.append(
+                    (
+                        path,
+                        file_hash,
+                        chunks,
+                        pool.submit(
+                            chunk_document_range,
+                            root,
+                            path,
+                            start,
+                            end,
+                            max_chunk_size,
+                            overlap,
+                        ),
+                    )
+                )
+                if len(in_flight) >= processes * 2:
+                    yield from _numbered(*in_flight.popleft())
+        while in_flight:
+            yield from _numbered(*in_flight.popleft())
+
+
+def _numbered(
+    path: str, file_hash: Future, chunks: Iterator[int], documents: Future
+) -> List[Document]:
+    documents = documents.result()
+    for document in documents:
+        chunk = next(chunks)
+        document.document_id = f"{path}#{chunk}"
+        document.metadata["chunk"] = chunk
+        document.metadata["file_hash"] = file_hash.result()
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root")
+    parser.add_argument("--collection", default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--range-size", type=int, default=RANGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    zep_api_url = "http://localhost:8000"
+    collection_name = args.collection or f"corpus{uuid4()}".replace("-", "")
+
+    client = ZepClient(base_url=zep_api_url)
+    print(f"Creating collection {collection_name}")
+    collection = client.document.add_collection(
+        name=collection_name,
+        description=f"Documents under {os.path.abspath(args.root)}",
+        embedding_dimensions=384,  # this must match the model you've configured in Zep
+        is_auto_embedded=True,
+    )
+
+    documents = corpus_documents(
+        args.root,
+        args.chunk_size,
+        args.overlap,
+        args.processes,
+        range_size=args.range_size,
+    )
+    uuids = upload_documents(
+        collection,
+        documents,
+        max_batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+    print(f"Added {len(uuids)} documents to collection {collection_name}")
+
+
+if __name__ == "__main__":
+    main()
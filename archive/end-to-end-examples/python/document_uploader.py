@@ -0,0 +1,181 @@
+""" Upload large numbers of documents to a Zep collection.
+
+    `DocumentUploader.upload` takes any iterable of Documents, including a
+    stream, and groups them into batches capped both by document count and
+    by estimated request size. Several batches are in flight at once. A
+    batch that fails is retried on its own with exponential backoff; one
+    rejected as too large (HTTP 413) is split in half, and the byte cap is
+    lowered for the batches after it. UUIDs are returned in input order.
+
+    For collections that are not auto-embedded, pass `embeddings` (any
+    LangChain `Embeddings`) and each batch is embedded just before upload.
+
+    uuids = upload_documents(collection, documents, concurrency=8)
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from event_loop import run_sync
+
+from zep_python import APIError
+from zep_python.document import Document, DocumentCollection
+
+# JSON bytes per embedding value, e.g. "-0.0123456789,"
+_BYTES_PER_DIMENSION = 20
+
+
+@dataclass
+class UploadStats:
+    documents: int = 0
+    batches: int = 0
+    retries: int = 0
+    splits: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+
+def from_langchain(documents) -> Iterator[Document]:
+    """Zep Documents for LangChain documents."""
+    for document in documents:
+        yield Document(content=document.page_content, metadata=document.metadata)
+
+
+class DocumentUploader:
+    def __init__(
+        self,
+        collection: DocumentCollection,
+        max_batch_size: int = 200,
+        max_batch_bytes: int = 1 << 20,
+        concurrency: int = 4,
+        retries: int = 3,
+        backoff: float = 0.5,
+        embeddings=None,
+    ):
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.embeddings = embeddings
+        self.stats = UploadStats()
+        # requests in flight, including those for split batches
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def _size(self, document: Document) -> int:
+        size = len(json.dumps(document.dict(exclude_none=True), default=str))
+        if self.embeddings is not None and document.embedding is None:
+            size += (self.collection.embedding_dimensions or 0) * _BYTES_PER_DIMENSION
+        return size
+
+    def _next_batch(self, documents: Iterator[Document]) -> List[Document]:
+        batch, size = [], 0
+        for document in documents:
+            batch.append(document)
+            size += self._size(document)
+            if len(batch) >= self.max_batch_size or size >= self.max_batch_bytes:
+                break
+        return batch
+
+    async def upload(self, documents: Iterable[Document]) -> List[str]:
+        self.stats = UploadStats()
+        documents = iter(documents)
+        results: Dict[int, List[str]] = {}
+        tasks = set()
+        offset = 0
+        try:
+            while True:
+                # batches are built off the event loop, so a slow source (a
+                # file being chunked, a process pool) does not stall uploads
+                batch = await asyncio.to_thread(self._next_batch, documents)
+                if not batch:
+                    break
+                if len(tasks) >= self.concurrency:
+                    done, tasks = await asyncio.wait(
+                        tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        results.update(task.result())
+                tasks.add(asyncio.ensure_future(self._upload(offset, batch)))
+                offset += len(batch)
+            for task in asyncio.as_completed(tasks):
+                results.update(await task)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            self.stats.finished = time.perf_counter()
+        return [uuid for start in sorted(results) for uuid in results[start]]
+
+    async def _upload(
+        self, offset: int, batch: List[Document]
+    ) -> List[Tuple[int, List[str]]]:
+        if self.embeddings is not None:
+            missing = [d for d in batch if d.embedding is None]
+            if missing:
+                vectors = await asyncio.to_thread(
+                    self.embeddings.embed_documents, [d.content for d in missing]
+                )
+                for document, vector in zip(missing, vectors):
+                    document.embedding = list(vector)
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slots:
+                    uuids = await self.collection.aadd_documents(batch)
+            except APIError as e:
+                status = (e.response_data or {}).get("status_code")
+                if status == 413 and len(batch) > 1:
+                    return await self._split(offset, batch)
+                if attempt == self.retries:
+                    raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+            else:
+                self.stats.documents += len(batch)
+                self.stats.batches += 1
+                return [(offset, uuids)]
+            self.stats.retries += 1
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def _split(
+        self, offset: int, batch: List[Document]
+    ) -> List[Tuple[int, List[str]]]:
+        self.stats.splits += 1
+        half = len(batch) // 2
+        # later batches start below the size that was rejected
+        self.max_batch_bytes = min(
+            self.max_batch_bytes, sum(self._size(d) for d in batch[:half])
+        )
+        first, second = await asyncio.gather(
+            self._upload(offset, batch[:half]),
+            self._upload(offset + half, batch[half:]),
+        )
+        return first + second
+
+
+def upload_documents(
+    collection: DocumentCollection, documents: Iterable[Document], **kwargs
+) -> List[str]:
+    """Uploads the documents from sync code, and reports throughput."""
+    uploader = DocumentUploader(collection, **kwargs)
+    uuids = run_sync(uploader.upload(documents))
+    stats = uploader.stats
+    print(
+        f"Uploaded {stats.documents} documents in {stats.batches} batches,"
+        f" {stats.elapsed:.1f}s ({stats.docs_per_second:.0f} docs/sec)"
+    )
+    return uuids
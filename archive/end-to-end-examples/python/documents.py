@@ -1,9 +1,12 @@
 """ Using Zep as a vector database. A simple sync example. """
-import time
 from typing import List
 from uuid import uuid4
 
+from batch_search import SearchQuery, merge_top_k, search_many
+from collection_waiter import wait_until_ready
+from document_uploader import upload_documents
 from faker import Faker
+from text_chunker import chunk_file
 
 from zep_python import ZepClient
 from zep_python.document import Document
@@ -12,49 +15,10 @@ fake = Faker()
 fake.random.seed(42)
 
 
-def naive_split_text(text: str, max_chunk_size: int):
-    """Naive text splitter chunks document into chunks of max_chunk_size,
-    using paragraphs and sentences as guides."""
-    chunks = []
-
-    # remove extraneous whitespace
-    text = " ".join(text.split())
-    # split into paragraphs
-    paragraphs = text.split("\n\n")
-
-    # clean up paragraphs
-    paragraphs = [p.strip() for p in paragraphs if len(p.strip()) > 0]
-
-    for paragraph in paragraphs:
-        if 0 > len(paragraph) <= max_chunk_size:
-            chunks.append(paragraph)
-        else:
-            sentences = paragraph.split(". ")
-            current_chunk = ""
-
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) > max_chunk_size:
-                    chunks.append(current_chunk)
-                    current_chunk = sentence
-                else:
-                    current_chunk += ". " + sentence
-
-            chunks.append(current_chunk)
-
-    return chunks
-
-
-def read_chunk_from_file(file: str, chunk_size: int):
-    with open(file, "r") as f:
-        text = f.read()
-
-    chunks = naive_split_text(text, chunk_size)
-
-    print(
-        f"Splitting text into {len(chunks)} chunks of max size {chunk_size} characters."
-    )
-
-    return chunks
+def read_chunk_from_file(file: str, chunk_size: int, overlap: int = 0):
+    """Chunks of at most chunk_size characters, streamed from the file."""
+    print(f"Splitting text into chunks of max size {chunk_size} characters.")
+    return chunk_file(file, chunk_size, overlap)
 
 
 def print_results(results: List[Document]):
@@ -91,20 +55,12 @@ def main(file: str):
 
     print(f"Adding {len(documents)} documents to collection {collection_name}")
 
-    uuids = collection.add_documents(documents)
+    uuids = upload_documents(collection, documents)
 
     print(f"Added {len(uuids)} documents to collection {collection_name}")
 
     # monitor embedding progress
-    while True:
-        c = client.document.get_collection(collection_name)
-        print(
-            "Embedding status: "
-            f"{c.document_embedded_count}/{c.document_count} documents embedded"
-        )
-        time.sleep(1)
-        if c.status == "ready":
-            break
+    wait_until_ready(client, [collection_name])
 
     # List all collections
     collections = client.document.list_collections()
@@ -143,27 +99,38 @@ def main(file: str):
         metadata={"foo": "bar", "baz": "qux"},
     )
 
-    # search for documents using both text and metadata
+    # search using both text and metadata, and by embedding, concurrently
     metadata_query = {
         "where": {"jsonpath": '$[*] ? (@.baz == "qux")'},
     }
-    new_search_results = collection.search(text=query, metadata=metadata_query, limit=5)
+    interesting_document = search_results[0]
+    new_search_results, embedding_search_results = search_many(
+        collection,
+        [
+            SearchQuery(text=query, metadata=metadata_query, limit=5),
+            SearchQuery(embedding=interesting_document.embedding, limit=5),
+        ],
+    )
     print(
         f"Found {len(new_search_results)} documents matching query '{query}'"
         f" {metadata_query}"
     )
     print_results(new_search_results)
 
-    # Search by embedding
-    interesting_document = search_results[0]
-    print(f"Searching for documents similar to:\n{interesting_document.content}\n")
-    embedding_search_results = collection.search(
-        embedding=interesting_document.embedding, limit=5
-    )
+    print(f"Documents similar to:\n{interesting_document.content}\n")
     print(f"Found {len(embedding_search_results)} documents matching embedding")
     print("Most similar documents:")
     print_results(embedding_search_results)
 
+    # search several phrasings of a question at once, and fuse the results
+    queries = ["the moon", "astronomy", "tables of the stars and planets"]
+    fused_results = merge_top_k(
+        search_many(collection, [SearchQuery(text=q, limit=5) for q in queries]),
+        k=5,
+    )
+    print(f"Top {len(fused_results)} documents across queries {queries}")
+    print_results(fused_results)
+
     # delete a document
     print(f"Deleting document {document_to_retrieve}")
     collection.delete_document(document_to_retrieve)
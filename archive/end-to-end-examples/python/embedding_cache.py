@@ -0,0 +1,285 @@
+""" A persistent, content-addressed cache of text embeddings.
+
+    Vectors are stored per embedding model in a memory-mapped matrix file,
+    as float32 or, to halve the size, float16. A hash index maps the
+    blake2b digest of each text to its row. Both files are append-only
+    between compactions, so every ingestion script can share one cache
+    directory, and re-embedding an unchanged corpus is served entirely from
+    disk.
+
+    `CachedEmbeddings` wraps any LangChain `Embeddings` with the cache.
+
+    cache = EmbeddingCache(".embedding_cache")
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(), cache)
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+DIGEST_SIZE = 16
+_INDEX_RECORD = np.dtype([("digest", f"V{DIGEST_SIZE}"), ("row", "<i8")])
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class _ModelStore:
+    """The vectors and hash index for a single embedding model.
+
+    Every process using the store locks `{prefix}.lock`, which is never
+    replaced: exclusively to append or compact, shared to read. The header
+    holds a generation number that `compact` increments, so a process whose
+    index predates a compaction reloads it before using any row numbers.
+    Within a generation the index only grows, and the records other
+    processes appended are read in as it does.
+    """
+
+    def __init__(self, prefix: str, dtype: np.dtype):
+        self.prefix = prefix
+        self.header_path = f"{prefix}.json"
+        self.vectors_path = f"{prefix}.vectors"
+        self.index_path = f"{prefix}.index"
+        self.lock_path = f"{prefix}.lock"
+        self.dimensions: Optional[int] = None
+        self.dtype = dtype
+        self.generation: Optional[int] = None
+        self.index: Dict[bytes, int] = {}
+        self._rows = 0
+        # bytes of the index file read so far
+        self._index_size = 0
+        self._map: Optional[np.memmap] = None
+        with self._locked(fcntl.LOCK_SH):
+            self._sync()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dimensions * self.dtype.itemsize
+
+    @contextmanager
+    def _locked(self, operation: int):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_header(self) -> Optional[dict]:
+        try:
+            with open(self.header_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self, generation: int):
+        header = {
+            "dimensions": self.dimensions,
+            "dtype": self.dtype.str,
+            "generation": generation,
+        }
+        with open(f"{self.header_path}.tmp", "w") as f:
+            json.dump(header, f)
+        os.replace(f"{self.header_path}.tmp", self.header_path)
+        self.generation = generation
+
+    def _sync(self):
+        # called with the lock held
+        header = self._read_header()
+        if header is None:
+            return
+        if header.get("generation", 0) != self.generation:
+            self._load(header)
+        elif os.path.getsize(self.index_path) >= (
+            self._index_size + _INDEX_RECORD.itemsize
+        ):
+            self._read_index()
+
+    def _load(self, header: dict):
+        self.dimensions = header["dimensions"]
+        # an existing store keeps the precision it was created with
+        self.dtype = np.dtype(header["dtype"])
+        self.generation = header.get("generation", 0)
+        self.index = {}
+        self._index_size = 0
+        self._read_index()
+        self._map = None
+
+    def _read_index(self):
+        """Read the index records appended since the last read."""
+        self._rows = os.path.getsize(self.vectors_path) // self._row_bytes
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_size)
+            records = f.read()
+        # ignore a record torn by an interrupted write
+        records = records[: len(records) - len(records) % _INDEX_RECORD.itemsize]
+        self._index_size += len(records)
+        self.index.update(
+            (bytes(r["digest"]), int(r["row"]))
+            for r in np.frombuffer(records, dtype=_INDEX_RECORD)
+            if r["row"] < self._rows
+        )
+
+    def _create(self, dimensions: int):
+        self.dimensions = dimensions
+        open(self.vectors_path, "ab").close()
+        open(self.index_path, "ab").close()
+        self._write_header(0)
+
+    def _read_rows(self, rows: Sequence[int]) -> np.ndarray:
+        if self._map is None or self._map.shape[0] < self._rows:
+            self._map = np.memmap(
+                self.vectors_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._rows, self.dimensions),
+            )
+        return np.asarray(self._map[list(rows)], dtype=np.float32)
+
+    def get_many(self, digests: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        found: List[Optional[np.ndarray]] = [None] * len(digests)
+        with self._locked(fcntl.LOCK_SH):
+            self._sync()
+            positions, rows = [], []
+            for i, digest in enumerate(digests):
+                row = self.index.get(digest)
+                if row is not None:
+                    positions.append(i)
+                    rows.append(row)
+            if rows:
+                for i, vector in zip(positions, self._read_rows(rows)):
+                    found[i] = vector
+        return found
+
+    def append(self, digests: List[bytes], vectors: np.ndarray):
+        with self._locked(fcntl.LOCK_EX):
+            self._sync()
+            if self.dimensions is None:
+                self._create(vectors.shape[1])
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"expected {self.dimensions}-dimensional vectors,"
+                    f" got {vectors.shape[1]}"
+                )
+            with open(self.vectors_path, "ab") as vectors_file, open(
+                self.index_path, "ab"
+            ) as index_file:
+                # another process may have appended since we last looked, and
+                # an interrupted write may have left a partial row or record
+                first_row = os.fstat(vectors_file.fileno()).st_size // self._row_bytes
+                os.ftruncate(vectors_file.fileno(), first_row * self._row_bytes)
+                index_size = os.fstat(index_file.fileno()).st_size
+                os.ftruncate(
+                    index_file.fileno(),
+                    index_size - index_size % _INDEX_RECORD.itemsize,
+                )
+                vectors_file.write(vectors.astype(self.dtype).tobytes())
+                vectors_file.flush()
+                # rows are written before the index entries that point at them
+                records = np.empty(len(digests), dtype=_INDEX_RECORD)
+                records["digest"] = digests
+                records["row"] = np.arange(first_row, first_row + len(digests))
+                index_file.write(records.tobytes())
+                index_file.flush()
+                self._index_size = index_file.tell()
+            self._rows = first_row + len(digests)
+            self.index.update(zip(digests, range(first_row, self._rows)))
+
+    def compact(self, keep: Optional[set] = None):
+        """Rewrite the store with only the rows the index still points at."""
+        with self._locked(fcntl.LOCK_EX):
+            header = self._read_header()
+            if header is None:
+                return
+            self._load(header)
+            digests = [d for d in self.index if keep is None or d in keep]
+            vectors = (
+                self._read_rows([self.index[d] for d in digests])
+                if digests
+                else np.empty((0, self.dimensions), dtype=np.float32)
+            )
+            records = np.empty(len(digests), dtype=_INDEX_RECORD)
+            records["digest"] = digests
+            records["row"] = np.arange(len(digests))
+            with open(f"{self.vectors_path}.tmp", "wb") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+            with open(f"{self.index_path}.tmp", "wb") as f:
+                f.write(records.tobytes())
+            self._map = None
+            os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+            self._write_header(self.generation + 1)
+            self._index_size = records.nbytes
+            self._rows = len(digests)
+            self.index = dict(zip(digests, range(self._rows)))
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, float16: bool = False):
+        self.directory = directory
+        self.dtype = np.dtype(np.float16 if float16 else np.float32)
+        self.hits = 0
+        self.misses = 0
+        self._stores: Dict[str, _ModelStore] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _store(self, model: str) -> _ModelStore:
+        if model not in self._stores:
+            name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            self._stores[model] = _ModelStore(
+                os.path.join(self.directory, name), self.dtype
+            )
+        return self._stores[model]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        found = self._store(model).get_many([text_digest(t) for t in texts])
+        hits = sum(v is not None for v in found)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return found
+
+    def put_many(self, model: str, texts: Sequence[str], vectors):
+        if texts:
+            self._store(model).append(
+                [text_digest(t) for t in texts], np.asarray(vectors, dtype=np.float32)
+            )
+
+    def compact(self, model: str, keep_texts: Optional[Sequence[str]] = None):
+        """Drop superseded rows and, given `keep_texts`, every other text."""
+        keep = None if keep_texts is None else {text_digest(t) for t in keep_texts}
+        self._store(model).compact(keep)
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        model: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        # each distinct missing text is embedded once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            embedded = self.embeddings.embed_documents(missing)
+            self.cache.put_many(self.model, missing, embedded)
+            by_text = dict(zip(missing, embedded))
+            vectors = [
+                v if v is not None else by_text[t] for t, v in zip(texts, vectors)
+            ]
+        return [list(map(float, v)) for v in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
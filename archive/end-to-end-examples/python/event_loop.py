@@ -0,0 +1,21 @@
+""" Run async Zep calls from the sync examples.
+
+    ZepClient's async methods share one httpx connection pool, and pooled
+    connections are tied to the event loop that opened them. Calling
+    `asyncio.run` more than once would close that loop and break the next
+    request that reuses one of its connections. `run_sync` instead runs
+    every coroutine on one long-lived loop.
+"""
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(awaitable)
@@ -1,8 +1,10 @@
-import time
 from typing import List
 from uuid import uuid4
 
+from collection_waiter import wait_until_ready
+from document_uploader import from_langchain, upload_documents
 from dotenv import load_dotenv
+from embedding_cache import CachedEmbeddings, EmbeddingCache
 from langchain.docstore.base import Document
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -33,7 +35,12 @@ def main():
     )
 
     # Ensure that you have OPENAI_API_KEY set in your environment or .env file
-    vectorstore = ZepVectorStore(collection, embedding=OpenAIEmbeddings())
+    # Embeddings are cached on disk, so re-running this example only embeds
+    # chunks it has not seen before
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(), EmbeddingCache(".embedding_cache")
+    )
+    vectorstore = ZepVectorStore(collection, embedding=embeddings)
 
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=400,
@@ -46,19 +53,15 @@ def main():
 
     print("Splitting text into chunks and adding them to the Zep vector store.")
     docs = text_splitter.create_documents([raw_text])
-    uuids = vectorstore.add_documents(docs)
+    uuids = upload_documents(collection, from_langchain(docs), embeddings=embeddings)
     print(f"Added {len(uuids)} documents to collection {collection_name}")
+    print(
+        f"Embedding cache: {embeddings.cache.hits} hits,"
+        f" {embeddings.cache.misses} misses"
+    )
 
     print("Waiting for documents to be embedded")
-    while True:
-        c = client.document.get_collection(collection_name)
-        print(
-            "Embedding status: "
-            f"{c.document_embedded_count}/{c.document_count} documents embedded"
-        )
-        time.sleep(1)
-        if c.status == "ready":
-            break
+    wait_until_ready(client, [collection_name])
 
     query = "What is Charles Babbage best known for?"
 
@@ -1,7 +1,8 @@
-import time
 from typing import List
 from uuid import uuid4
 
+from collection_waiter import wait_until_ready
+from document_uploader import from_langchain, upload_documents
 from dotenv import load_dotenv
 from faker import Faker
 from langchain.chains import ConversationalRetrievalChain
@@ -50,19 +51,11 @@ def main():
 
     print("Splitting text into chunks and adding them to the Zep vector store.")
     docs = text_splitter.create_documents([raw_text])
-    uuids = vectorstore.add_documents(docs)
+    uuids = upload_documents(collection, from_langchain(docs))
     print(f"Added {len(uuids)} documents to collection {collection_name}")
 
     print("Waiting for documents to be embedded")
-    while True:
-        c = client.document.get_collection(collection_name)
-        print(
-            "Embedding status: "
-            f"{c.document_embedded_count}/{c.document_count} documents embedded"
-        )
-        time.sleep(1)
-        if c.status == "ready":
-            break
+    wait_until_ready(client, [collection_name])
 
     llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0.0)
 
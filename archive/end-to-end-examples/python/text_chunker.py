@@ -0,0 +1,179 @@
+""" A streaming text chunker for large document dumps.
+
+    `chunk_file` reads a file in fixed-size blocks and yields chunks of at
+    most `max_chunk_size` characters, so memory use is bounded by the block
+    size rather than the file size. Chunk boundaries fall between
+    paragraphs where possible; paragraphs too long for one chunk are split
+    between sentences, and sentences too long for one chunk between words.
+    Whitespace within a paragraph is collapsed. Small paragraphs are packed
+    together, separated by a blank line.
+
+    With `overlap`, each chunk starts with the trailing sentences of the
+    previous chunk, up to `overlap` characters of them.
+
+    for chunk in chunk_file("corpus.txt", max_chunk_size=500, overlap=50):
+        ...
+
+    A large file can be chunked in parallel by byte ranges: given `start`
+    and `end`, only the paragraphs that begin in that range are read.
+    Adjacent ranges share their boundary, so together they cover every
+    paragraph exactly once.
+"""
+import codecs
+import re
+from collections import deque
+from typing import BinaryIO, Deque, Iterable, Iterator, Optional, Tuple
+
+BLOCK_SIZE = 1 << 20
+
+_PARAGRAPH_BREAK = re.compile(r"\n[^\S\n]*\n")
+_PARAGRAPH_BREAK_BYTES = re.compile(rb"\n[ \t\r\f\v]*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _paragraph_start(f: BinaryIO, offset: int, block_size: int) -> int:
+    """The offset of the first paragraph beginning at or after `offset`."""
+    if offset == 0:
+        return 0
+    f.seek(offset)
+    buffer = b""
+    while block := f.read(block_size):
+        buffer += block
+        match = _PARAGRAPH_BREAK_BYTES.search(buffer)
+        if match:
+            return offset + match.end()
+        # a break can only continue from the last newline
+        cut = buffer.rfind(b"\n")
+        cut = len(buffer) if cut < 0 else cut
+        offset += cut
+        buffer = buffer[cut:]
+    return offset + len(buffer)
+
+
+def read_paragraphs(
+    file: str,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[str]:
+    """Paragraphs of a file, with whitespace collapsed.
+
+    With `start` and `end`, only the paragraphs beginning in that byte
+    range. A paragraph longer than `block_size` is yielded in block-sized
+    parts, split between words.
+    """
+    pending = ""
+    with open(file, "rb") as f:
+        begin = _paragraph_start(f, start, block_size)
+        stop = None if end is None else _paragraph_start(f, end, block_size)
+        f.seek(begin)
+        decoder = codecs.getincrementaldecoder("utf-8-sig" if begin == 0 else "utf-8")()
+        remaining = None if stop is None else stop - begin
+        while raw := f.read(
+            block_size if remaining is None else min(block_size, remaining)
+        ):
+            if remaining is not None:
+                remaining -= len(raw)
+            text = pending + decoder.decode(raw)
+            last = 0
+            for match in _PARAGRAPH_BREAK.finditer(text):
+                yield from _clean(text[last : match.start()])
+                last = match.end()
+            pending = text[last:]
+            if len(pending) > block_size:
+                cut = max(pending.rfind(" "), pending.rfind("\n"))
+                if cut <= 0:
+                    cut = len(pending)
+                yield from _clean(pending[:cut])
+                pending = pending[cut:]
+        pending += decoder.decode(b"", final=True)
+    yield from _clean(pending)
+
+
+def _clean(paragraph: str) -> Iterator[str]:
+    paragraph = " ".join(paragraph.split())
+    if paragraph:
+        yield paragraph
+
+
+def _pieces(paragraph: str, max_size: int) -> Iterator[str]:
+    if len(paragraph) <= max_size:
+        yield paragraph
+        return
+    for sentence in _SENTENCE_END.split(paragraph):
+        if len(sentence) <= max_size:
+            yield sentence
+            continue
+        # a run-on sentence is split between words, and a huge word anywhere
+        piece = ""
+        for word in sentence.split(" "):
+            while len(word) > max_size:
+                if piece:
+                    yield piece
+                    piece = ""
+                yield word[:max_size]
+                word = word[max_size:]
+            if piece and len(piece) + 1 + len(word) > max_size:
+                yield piece
+                piece = ""
+            piece = f"{piece} {word}" if piece else word
+        if piece:
+            yield piece
+
+
+def split_paragraphs(
+    paragraphs: Iterable[str], max_chunk_size: int, overlap: int = 0
+) -> Iterator[str]:
+    if not 0 <= overlap < max_chunk_size:
+        raise ValueError("overlap must be at least 0 and less than max_chunk_size")
+
+    # (separator, piece) pairs in the current chunk; the first separator is
+    # not part of the chunk text
+    window: Deque[Tuple[str, str]] = deque()
+    size = 0  # total length of the pieces and separators in the window
+    fresh = False  # whether the window holds pieces not yet emitted
+
+    def chunk_length() -> int:
+        return size - len(window[0][0])
+
+    for paragraph in paragraphs:
+        separator = "\n\n"
+        for piece in _pieces(paragraph, max_chunk_size):
+            while window and chunk_length() + len(separator) + len(piece) > (
+                max_chunk_size
+            ):
+                if fresh:
+                    first, *rest = window
+                    yield first[1] + "".join(s + p for s, p in rest)
+                    fresh = False
+                    # keep the trailing pieces that fit in the overlap
+                    while window and chunk_length() > overlap:
+                        removed = window.popleft()
+                        size -= len(removed[0]) + len(removed[1])
+                else:
+                    # the overlap and the next piece do not fit together
+                    removed = window.popleft()
+                    size -= len(removed[0]) + len(removed[1])
+            window.append((separator, piece))
+            size += len(separator) + len(piece)
+            fresh = True
+            separator = " "
+
+    if fresh:
+        first, *rest = window
+        yield first[1] + "".join(s + p for s, p in rest)
+
+
+def chunk_file(
+    file: str,
+    max_chunk_size: int,
+    overlap: int = 0,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[str]:
+    return split_paragraphs(
+        read_paragraphs(file, max(block_size, max_chunk_size), start, end),
+        max_chunk_size,
+        overlap,
+    )
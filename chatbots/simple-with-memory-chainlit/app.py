@@ -1,21 +1,94 @@
+import asyncio
+import json
 import os
+import time
 import uuid
 
 import chainlit as cl
-from zep_cloud import FactRatingExamples, FactRatingInstruction
+from catalog import CatalogIndex, render_shoes, sync_with_collection
+from chainlit.logger import logger
+from client_proxy import unwrap_client
+from zep_cloud import FactRatingExamples, FactRatingInstruction, NotFoundError
 from chat_history_shoe_purchase import history as previous_chat_history
 from dotenv import find_dotenv, load_dotenv
+from deadlines import hedged, remaining, turn_budget
+from fact_store import FactStore
+from limiter import AdaptiveLimiter, Priority, limit_client, priority
+from llm_stream import StreamResult, stream_completion
+from memory_writer import (
+    WriteBehindQueue,
+    install_shutdown_flush,
+    merge_pending,
+    tag_message,
+)
+from metrics import metrics, start_exporters
 from openai import AsyncOpenAI
+from prompt_budget import PromptAssembler
+from response_cache import SemanticResponseCache
+from seeding import SeedTemplate
+from session_pool import ReadySession, SessionPool
+from shared_cache import SharedSessionCache, create_backend
+from shoe_data import shoes
+from task_graph import TaskGraph
+from turn_scheduler import TurnScheduler
 
 from zep_cloud.client import AsyncZep
-from zep_cloud.types import Message
+from zep_cloud.types import Memory, Message
 
 load_dotenv(dotenv_path=find_dotenv())
 
 API_KEY = os.environ.get("ZEP_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# Optionally clone new sessions from a pre-seeded Zep session
+TEMPLATE_SESSION_ID = os.environ.get("ZEP_TEMPLATE_SESSION_ID")
 
 OPENAI_MODEL = "gpt-4o"
+# Upper bound on prompt tokens per turn, defaults to a per-model budget
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 0)) or None
+# Number of pre-provisioned sessions to keep ready, and when to refill them
+SESSION_POOL_SIZE = int(os.environ.get("SESSION_POOL_SIZE", 8))
+SESSION_POOL_LOW_WATER = min(
+    int(os.environ.get("SESSION_POOL_LOW_WATER", 2)), SESSION_POOL_SIZE
+)
+# With an id, the pool records its sessions in Zep so that a restarted
+# process reclaims the ones it left unused. The id must be unique to the
+# process and stable across its restarts, e.g. the host name and worker
+# number; without one, sessions left unused by a crash are not reclaimed.
+SESSION_POOL_ID = os.environ.get("SESSION_POOL_ID")
+# Serve Prometheus metrics on this port and/or write them to this file
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0)) or None
+METRICS_FILE = os.environ.get("METRICS_FILE")
+# Reuse answers to semantically similar questions asked in the same context
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "false").lower() == "true"
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Stream tokens into the reply as they are generated
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "true").lower() == "true"
+# Upper bounds on concurrent calls, and optional requests/second caps, shared
+# by all sessions. The concurrency actually used adapts to latency and 429s.
+ZEP_MAX_CONCURRENCY = int(os.environ.get("ZEP_MAX_CONCURRENCY", 32))
+ZEP_RATE_LIMIT = float(os.environ.get("ZEP_RATE_LIMIT", 0)) or None
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_RATE_LIMIT = float(os.environ.get("OPENAI_RATE_LIMIT", 0)) or None
+# Where session memory and facts are cached: "memory" (this process only),
+# "mmap:/path/to/file" (workers on one host) or "redis://host:port"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+# Time allowed for the lookups of a turn (memory read, question embedding)
+# before the LLM is called. A memory read that is slower than the usual
+# HEDGE_PERCENTILE is sent again, and one that runs out of time falls back
+# to the last memory read for the session.
+TURN_BUDGET = float(os.environ.get("TURN_BUDGET", 1.5)) or None
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 0.95))
+# used until enough memory reads have been timed to estimate the percentile
+DEFAULT_HEDGE_DELAY = 0.3
+HEDGE_MIN_SAMPLES = 20
+# Ground answers in the top matching shoes from an in-memory catalog index
+CATALOG_RETRIEVAL = os.environ.get("CATALOG_RETRIEVAL", "true").lower() == "true"
+CATALOG_TOP_K = int(os.environ.get("CATALOG_TOP_K", 3))
+# Optionally keep the index in sync with the collection written by ingest.py
+CATALOG_SYNC_COLLECTION = os.environ.get("CATALOG_SYNC_COLLECTION")
+CATALOG_SYNC_INTERVAL = float(os.environ.get("CATALOG_SYNC_INTERVAL", 300))
+# Answer messages sent while a turn is running together, in one LLM call
+COALESCE_MESSAGES = os.environ.get("COALESCE_MESSAGES", "true").lower() == "true"
 
 ASSISTANT_ROLE = "assistant"
 USER_ROLE = "user"
@@ -24,53 +97,151 @@ BOT_NAME = "Assistant"
 
 MIN_FACT_RATING = 0.5
 
-zep = AsyncZep(api_key=API_KEY)
+# Every call through these clients is timed and its errors counted, and
+# waits for a slot from the dependency's limiter
+zep_limiter = AdaptiveLimiter(max_limit=ZEP_MAX_CONCURRENCY, rate=ZEP_RATE_LIMIT)
+zep = limit_client(
+    metrics.instrument(AsyncZep(api_key=API_KEY), "zep"), "zep", zep_limiter
+)
 
-openai = AsyncOpenAI(api_key=OPENAI_API_KEY)
+memory_cache = SharedSessionCache(create_backend(CACHE_BACKEND))
+
+# Rendered facts blocks, per session, updated incrementally between turns
+fact_stores: dict[str, FactStore] = {}
+
+# Chat turns are persisted to Zep in the background, one memory.add per flush.
+# Each completed write invalidates the session's cached memory in all workers.
+memory_writer = WriteBehindQueue(zep, on_written=memory_cache.invalidate)
+install_shutdown_flush(memory_writer, lambda: AsyncZep(api_key=API_KEY))
+
+openai_limiter = AdaptiveLimiter(
+    max_limit=OPENAI_MAX_CONCURRENCY, rate=OPENAI_RATE_LIMIT
+)
+openai = limit_client(
+    metrics.instrument(AsyncOpenAI(api_key=OPENAI_API_KEY), "openai"),
+    "openai",
+    openai_limiter,
+)
+
+prompt_assembler = PromptAssembler(OPENAI_MODEL, budget=PROMPT_TOKEN_BUDGET)
+
+response_cache = SemanticResponseCache() if RESPONSE_CACHE else None
+
+turn_scheduler = TurnScheduler(
+    coalesce=COALESCE_MESSAGES,
+    observe_wait=lambda seconds: metrics.observe("turn_wait_seconds", seconds),
+)
+
+# Holds the current index, which the sync task swaps out as the catalog changes
+catalog = {"index": CatalogIndex(shoes) if CATALOG_RETRIEVAL else None}
+catalog_sync = None
 
 welcome_message = "Hello! How can I help you today?"
 
 base_system_prompt = """You are a friendly assistant"""
 
 
+seed_template = None
+
+
+async def get_seed_template() -> SeedTemplate:
+    global seed_template
+    if seed_template is None:
+        if TEMPLATE_SESSION_ID:
+            seed_template = await SeedTemplate.from_session(zep, TEMPLATE_SESSION_ID)
+        else:
+            seed_template = SeedTemplate.from_history(
+                previous_chat_history, USER_NAME, BOT_NAME
+            )
+    return seed_template
+
+
+async def log_seed_progress(session_id: str, sent: int, total: int):
+    logger.debug(f"Seeded {sent}/{total} messages into session {session_id}")
+
+
 async def load_previous_chat_history(session_id: str):
-    # batch chat turns into pairs
-    for i in range(0, len(previous_chat_history), 2):
-        await zep.memory.add(
-            session_id=session_id,
-            messages=[
-                Message(
-                    role_type=msg["role_type"],
-                    role=USER_NAME if msg["role_type"] == USER_ROLE else BOT_NAME,
-                    content=msg["content"],
-                )
-                for msg in previous_chat_history[i : i + 2]
-            ],
+    template = await get_seed_template()
+    # seeding queues behind the calls of interactive turns
+    with priority(Priority.BACKGROUND):
+        await template.seed(zep, session_id, on_progress=log_seed_progress)
+    await memory_cache.invalidate(session_id)
+
+
+async def get_memory(session_id: str):
+    return await memory_cache.fetch(
+        session_id,
+        MIN_FACT_RATING,
+        lambda: zep.memory.get(session_id=session_id, min_rating=MIN_FACT_RATING),
+    )
+
+
+def memory_hedge_delay() -> float:
+    latencies = metrics.histogram("latency_seconds", {"operation": "zep.memory.get"})
+    if latencies.count < HEDGE_MIN_SAMPLES:
+        return DEFAULT_HEDGE_DELAY
+    return latencies.percentile(HEDGE_PERCENTILE)
+
+
+async def get_turn_memory(session_id: str) -> tuple[Memory, bool]:
+    """Read memory within the turn's budget. Returns it and whether it is stale."""
+
+    def read():
+        return zep.memory.get(session_id=session_id, min_rating=MIN_FACT_RATING)
+
+    try:
+        memory = await memory_cache.fetch(
+            session_id,
+            MIN_FACT_RATING,
+            lambda: hedged(read, hedge_after=memory_hedge_delay(), timeout=remaining()),
         )
+        return memory, False
+    except Exception as e:
+        reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+        metrics.inc("degraded_turns_total", {"reason": reason})
+        logger.warning(f"Memory read for {session_id} failed ({reason}), using stale")
+        # with nothing to fall back on, the turn goes ahead on its own messages
+        return memory_cache.stale(session_id, MIN_FACT_RATING) or Memory(), True
 
 
 @cl.step(name="Zep Chat History Retrieval", type="retrieval", language="python")
-async def get_history(session_id: str):
-    memory = await zep.memory.get(session_id=session_id, min_rating=MIN_FACT_RATING)
-    message_history = []
+async def get_history(session_id: str, pending: list[Message]):
+    memory, degraded = await get_turn_memory(session_id)
+    store = fact_stores.get(session_id)
+    if store is None:
+        # another worker may have been rendering this session's facts
+        store = await memory_cache.load_facts(session_id) or FactStore()
+        fact_stores[session_id] = store
+    if degraded:
+        # a stale or empty fallback read says nothing about which facts were
+        # removed, so the last rendering is kept and nothing is written back
+        facts = store.rendered
+    else:
+        previous = store.rendered
+        facts = store.render(memory.relevant_facts)
+        if facts != previous:
+            await memory_cache.save_facts(session_id, store)
+    summary = None
+
+    if memory.summary and memory.summary.content:
+        summary = memory.summary.content
+
+    # Messages still being written are merged in so we read our own writes
+    messages = [
+        {"role": message.role_type, "content": message.content}
+        for message in merge_pending(memory.messages or [], pending)
+    ]
+    return {
+        "facts": facts,
+        "summary": summary,
+        "messages": messages,
+        "degraded": degraded,
+    }
 
-    if memory.relevant_facts:
-        message_history.append(
-            {
-                "role_type": "user",
-                "content": "Facts about the user:\n"
-                + "\n".join([f.fact for f in memory.relevant_facts]),
-            }
-        )
 
-    for message in memory.messages:
-        message_history.append(
-            {
-                "role_type": message.role_type,
-                "content": message.content,
-            }
-        )
-    return message_history
+async def wait_until_ready():
+    # shielded, so a cancelled turn does not cancel the session setup
+    await asyncio.shield(cl.user_session.get("session_ready"))
 
 
 async def display_actions():
@@ -88,7 +259,9 @@ async def display_actions():
 @cl.action_callback("Print Facts")
 async def print_facts():
     session_id = cl.user_session.get("session_id")
-    memory = await zep.memory.get(session_id=session_id, min_rating=MIN_FACT_RATING)
+    await wait_until_ready()
+    with priority(Priority.BACKGROUND):
+        memory = await get_memory(session_id)
 
     if memory.relevant_facts:
         msg = cl.Message(
@@ -99,50 +272,169 @@ async def print_facts():
 
 
 @cl.step(name="OpenAI", type="llm")
-async def call_openai(messages):
-    response = await openai.chat.completions.create(
-        model=OPENAI_MODEL,
-        temperature=0.1,
-        messages=messages,
+async def call_openai(messages, msg: cl.Message) -> str:
+    if not STREAM_RESPONSES:
+        response = await openai.chat.completions.create(
+            model=OPENAI_MODEL,
+            temperature=0.1,
+            messages=messages,
+        )
+        msg.content = response.choices[0].message.content
+        return msg.content
+
+    # create() returns once the headers arrive, so the limiter slot and the
+    # timing cover the whole stream instead of the proxied call
+    async def stream() -> StreamResult:
+        async with metrics.timed("openai.chat.completions.create"):
+            return await stream_completion(
+                unwrap_client(openai),
+                msg.stream_token,
+                model=OPENAI_MODEL,
+                temperature=0.1,
+                messages=messages,
+            )
+
+    result = await openai_limiter.run(stream)
+    if result.time_to_first_token is not None:
+        metrics.observe("llm_time_to_first_token_seconds", result.time_to_first_token)
+    metrics.inc("llm_completion_tokens_total", value=result.completion_tokens)
+    logger.info(
+        f"OpenAI turn: ttft={result.time_to_first_token or 0:.3f}s"
+        f" total={result.total_time:.3f}s"
+        f" tokens/s={result.tokens_per_second:.1f}"
+    )
+    return result.content
+
+
+async def embed_question(text: str):
+    try:
+        response = await openai.embeddings.create(model=EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+    except Exception as e:
+        # without an embedding the turn simply bypasses the cache
+        logger.warning(f"Failed to embed question for the response cache: {e}")
+        return None
+
+
+def find_shoes(question: str):
+    index = catalog["index"]
+    if index is None:
+        return None
+    started = time.perf_counter()
+    found = index.search(question, k=CATALOG_TOP_K)
+    metrics.observe(
+        "latency_seconds",
+        time.perf_counter() - started,
+        {"operation": "catalog.search"},
     )
-    return response.choices[0].message
+    return render_shoes(found)
+
+
+def cache_context(chat_history: dict, shoes: str | None) -> str:
+    # An answer depends on more than the question: the facts, the shoes
+    # found for it, and what a follow-up like "which one is lightest?"
+    # refers to, the last reply
+    last_reply = next(
+        (
+            m["content"]
+            for m in reversed(chat_history["messages"])
+            if m["role"] == ASSISTANT_ROLE
+        ),
+        None,
+    )
+    return json.dumps([chat_history["facts"], shoes, last_reply])
 
 
-@cl.on_message
-async def on_message(message: cl.Message):
+async def answer(prompt, msg: cl.Message, question_embedding, context: str) -> str:
+    if question_embedding is not None:
+        cached = response_cache.lookup(question_embedding, context)
+        if cached is not None:
+            msg.content = cached.answer
+            return cached.answer
+
+    started = time.perf_counter()
+    content = await call_openai(prompt, msg)
+    if question_embedding is not None:
+        response_cache.store(
+            question_embedding, context, content, time.perf_counter() - started
+        )
+    return content
+
+
+async def gather_context(session_id: str, question: str, user_messages: list[Message]):
+    # The question is embedded while history is being fetched
+    question_embedding = None
+    if response_cache is not None:
+        question_embedding = asyncio.ensure_future(embed_question(question))
+
+    # Snapshot the unacknowledged messages before reading, so the read can
+    # run while the previous turn is still being written
+    pending = memory_writer.pending_messages(session_id) + user_messages
+    chat_history = await get_history(session_id, pending)
+
+    if question_embedding is not None:
+        try:
+            question_embedding = await asyncio.wait_for(question_embedding, remaining())
+        except asyncio.TimeoutError:
+            # out of time, so this turn bypasses the response cache
+            question_embedding = None
+    return chat_history, question_embedding
+
+
+async def answer_turn(messages: list[cl.Message]):
+    """Answer one or more user messages, oldest first, with a single reply."""
     session_id = cl.user_session.get("session_id")
-    # Add the user's message to Zep's memory
-    await zep.memory.add(
-        session_id=session_id,
-        messages=[
+    # tagged now, so reads can tell whether they have been written yet
+    user_messages = [
+        tag_message(
             Message(
                 role_type=USER_ROLE,
                 content=message.content,
                 role=cl.user_session.get("user_name"),
-            ),
-        ],
-    )
-
-    chat_history = await get_history(session_id)
+            )
+        )
+        for message in messages
+    ]
+    question = "\n".join(message.content for message in messages)
 
-    # Load the base prompt into
-    prompt = [{"role": "system", "content": base_system_prompt}]
+    try:
+        await wait_until_ready()
 
-    prompt = prompt + [
-        {"role": message["role_type"], "content": message["content"]}
-        for message in chat_history
-    ]
+        # The turn's lookups share one latency budget, which starts now
+        with turn_budget(TURN_BUDGET):
+            chat_history, question_embedding = await gather_context(
+                session_id, question, user_messages
+            )
 
-    response_message = await call_openai(prompt)
-    msg = cl.Message(author=BOT_NAME, content=(response_message.content))
-    await msg.send()
+        # The system prompt, facts and matching shoes are always sent; older turns
+        # are dropped, or replaced by the session summary, to stay within budget
+        shoes = find_shoes(question)
+        prompt = prompt_assembler.assemble(
+            base_system_prompt,
+            chat_history["messages"],
+            facts=chat_history["facts"],
+            summary=chat_history["summary"],
+            context=shoes,
+        )
 
-    await zep.memory.add(
-        session_id=session_id,
-        messages=[
+        msg = cl.Message(author=BOT_NAME, content="")
+        response_content = await answer(
+            prompt, msg, question_embedding, cache_context(chat_history, shoes)
+        )
+        await msg.send()
+    except BaseException:
+        # a failed or cancelled turn still keeps what the user said
+        await memory_writer.put(session_id, user_messages)
+        raise
+
+    # Queue the user's messages and the reply as a single memory.add
+    await memory_writer.put(
+        session_id,
+        [
+            *user_messages,
             Message(
                 role_type=ASSISTANT_ROLE,
-                content=response_message.content,
+                content=response_content,
                 role=BOT_NAME,
             ),
         ],
@@ -151,31 +443,185 @@ async def on_message(message: cl.Message):
     await display_actions()
 
 
-@cl.on_chat_start
-async def main():
+@cl.on_message
+async def on_message(message: cl.Message):
+    # Turns run one at a time per session. Messages sent while a turn is
+    # running are answered together by the next one.
+    await turn_scheduler.run(cl.user_session.get("session_id"), message, answer_turn)
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    session_id = cl.user_session.get("session_id")
+    await memory_writer.close_session(session_id)
+    await memory_cache.discard(session_id)
+    fact_stores.pop(session_id, None)
+
+
+def session_setup(user_id: str, session_id: str) -> TaskGraph:
+    # Steps only wait on the steps they depend on
+    setup = TaskGraph()
+    setup.add("user", lambda: zep.user.add(user_id=user_id))
+    setup.add("template", get_seed_template)
+    setup.add(
+        "session",
+        lambda: zep.memory.add_session(
+            user_id=user_id,
+            session_id=session_id,
+            fact_rating_instruction=FactRatingInstruction(
+                instruction="Rate the facts by how relevant they are to purchasing shoes.",
+                examples=FactRatingExamples(
+                    high="The user has agreed to purchase a Reebok running shoe.",
+                    medium="The user prefers running to cycling.",
+                    low="The user purchased a dress.",
+                ),
+            ),
+        ),
+        deps=["user"],
+    )
+    setup.add(
+        "history",
+        lambda: load_previous_chat_history(session_id),
+        deps=["session", "template"],
+    )
+    return setup
+
+
+# The pool's sessions by id, as {"user_id": ..., "state": ...}, where state
+# is "provisioning" until set up and "ready" until a chat claims it. With a
+# SESSION_POOL_ID this is saved in the metadata of one Zep user, so a
+# restart reads a single record rather than listing every user.
+pooled_sessions: dict[str, dict] = {}
+pool_manifest_lock = asyncio.Lock()
+POOL_MANIFEST_USER_ID = f"session-pool-{SESSION_POOL_ID}"
+
+
+async def save_pool_manifest():
+    if SESSION_POOL_ID is None:
+        return
+    # each save writes the latest state, so saves must not overtake each other
+    async with pool_manifest_lock:
+        await zep.user.update(
+            POOL_MANIFEST_USER_ID, metadata={"session_pool": dict(pooled_sessions)}
+        )
+
+
+async def provision_session() -> ReadySession:
     user_id = str(uuid.uuid4())
     session_id = str(uuid.uuid4())
+    with priority(Priority.BACKGROUND):
+        pooled_sessions[session_id] = {"user_id": user_id, "state": "provisioning"}
+        await save_pool_manifest()
+        await session_setup(user_id, session_id).run()
+        pooled_sessions[session_id]["state"] = "ready"
+        await save_pool_manifest()
+    return ReadySession(user_id=user_id, session_id=session_id)
+
+
+async def reclaim_sessions() -> list[ReadySession]:
+    # Ready sessions left by this pool's previous run are reused, and
+    # half-provisioned ones deleted.
+    with priority(Priority.BACKGROUND):
+        try:
+            manifest = await zep.user.get(POOL_MANIFEST_USER_ID)
+        except NotFoundError:
+            await zep.user.add(user_id=POOL_MANIFEST_USER_ID)
+            return []
+        reclaimed = []
+        previous = (manifest.metadata or {}).get("session_pool") or {}
+        for session_id, entry in previous.items():
+            session = ReadySession(entry["user_id"], session_id)
+            if entry["state"] == "ready":
+                pooled_sessions[session_id] = dict(entry)
+                reclaimed.append(session)
+            else:
+                try:
+                    await release_session(session)
+                except Exception as e:
+                    logger.error(f"Failed to delete pooled session {session_id}: {e}")
+        await save_pool_manifest()
+    logger.info(f"Reclaimed {len(reclaimed)} pooled sessions")
+    return reclaimed
+
+
+async def release_session(session: ReadySession):
+    # deleting the user deletes its sessions too
+    with priority(Priority.BACKGROUND):
+        await zep.user.delete(session.user_id)
+        pooled_sessions.pop(session.session_id, None)
+        await save_pool_manifest()
+
+
+async def claim_session(session: ReadySession) -> bool:
+    """Record that a chat is taking the session, before it is used."""
+    entry = pooled_sessions.pop(session.session_id, None)
+    try:
+        await save_pool_manifest()
+        return True
+    except Exception as e:
+        logger.error(f"Failed to claim pooled session {session.session_id}: {e}")
+        # still recorded as ready, so the next run reclaims it
+        if entry is not None:
+            pooled_sessions[session.session_id] = entry
+        return False
+
+
+session_pool = SessionPool(
+    provision_session,
+    low_water=SESSION_POOL_LOW_WATER,
+    high_water=SESSION_POOL_SIZE,
+    reclaim=reclaim_sessions if SESSION_POOL_ID is not None else None,
+    release=release_session,
+)
+
+
+def collect_app_metrics(m):
+    for name, value in memory_cache.stats().items():
+        m.set_gauge(f"memory_cache_{name}", value)
+    m.set_gauge("session_pool_ready", session_pool.size)
+    for name, value in turn_scheduler.stats().items():
+        m.set_gauge(f"turn_scheduler_{name}", value)
+    for dependency, limiter in (("zep", zep_limiter), ("openai", openai_limiter)):
+        for name, value in limiter.stats().items():
+            m.set_gauge(f"limiter_{name}", value, {"dependency": dependency})
+    if response_cache is not None:
+        for name, value in response_cache.stats().items():
+            m.set_gauge(f"response_cache_{name}", value)
+
+
+metrics.add_collector(collect_app_metrics)
+
+
+@cl.on_chat_start
+async def main():
+    global catalog_sync
+    await start_exporters(port=METRICS_PORT, path=METRICS_FILE)
+    await memory_cache.start()
+    session_pool.start()
+    if CATALOG_RETRIEVAL and CATALOG_SYNC_COLLECTION and catalog_sync is None:
+        catalog_sync = asyncio.ensure_future(
+            sync_with_collection(
+                catalog, zep, CATALOG_SYNC_COLLECTION, CATALOG_SYNC_INTERVAL
+            )
+        )
+    pooled = session_pool.take()
+    if pooled is not None and not await claim_session(pooled):
+        pooled = None
+
+    if pooled is not None:
+        user_id, session_id = pooled.user_id, pooled.session_id
+        session_ready = asyncio.get_running_loop().create_future()
+        session_ready.set_result(None)
+    else:
+        # The pool is empty, so set up a session now, in the background
+        user_id = str(uuid.uuid4())
+        session_id = str(uuid.uuid4())
+        session_ready = asyncio.ensure_future(session_setup(user_id, session_id).run())
+
     cl.user_session.set("user_id", user_id)
     cl.user_session.set("session_id", session_id)
+    # on_message and actions wait on this before touching the session
+    cl.user_session.set("session_ready", session_ready)
 
     msg = cl.Message(author=BOT_NAME, content=welcome_message)
     await msg.send()
-
-    await zep.user.add(
-        user_id=user_id,
-    )
-
-    await zep.memory.add_session(
-        user_id=user_id,
-        session_id=session_id,
-        fact_rating_instruction=FactRatingInstruction(
-            instruction="Rate the facts by how relevant they are to purchasing shoes.",
-            examples=FactRatingExamples(
-                high="The user has agreed to purchase a Reebok running shoe.",
-                medium="The user prefers running to cycling.",
-                low="The user purchased a dress.",
-            ),
-        ),
-    )
-
-    await load_previous_chat_history(session_id)
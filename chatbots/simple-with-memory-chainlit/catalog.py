@@ -0,0 +1,176 @@
+""" In-process retrieval over the shoe catalog.
+
+    The catalog is small and changes rarely, so rather than searching the
+    remote Zep collection on every turn, it is indexed in memory at startup
+    as a NumPy matrix of L2-normalized, sublinear TF-IDF vectors over hashed
+    word features of each shoe's canonical text. Keyword (brand/model) and
+    shoe type filters are applied too, as are price and weight ceilings
+    parsed from the question and checked against the compiled catalog's
+    numeric columns. Queries are vectorized locally with the same features,
+    so a search is one small matrix-vector product and never leaves the
+    process.
+
+    `sync_with_collection` optionally keeps the index in step with the Zep
+    collection written by ingest.py, rebuilding it when the collection
+    changes.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+from catalog_compiler import compile_catalog, specs
+
+logger = logging.getLogger(__name__)
+
+FEATURES = 4096
+CATALOG_TAG = "shoes"
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CEILING = r"(?:under|below|less than|lighter than|cheaper than|max(?:imum)?|up to|<)"
+_PRICE_CEILING = re.compile(_CEILING + r"\s*\$?\s*(\d+)(?!\d|\s*(?:\.\d+\s*)?oz)")
+_WEIGHT_CEILING = re.compile(_CEILING + r"\s*(\d+(?:\.\d+)?)\s*(?:oz|ounces)")
+_TYPE_WORDS = {"trail", "road", "neutral", "stability"}
+_STOP_WORDS = {
+    "the", "and", "for", "with", "that", "this", "are", "any", "you", "can",
+    "what", "which", "have", "shoe", "shoes", "pair", "one", "ones", "about",
+}  # fmt: skip
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _feature(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "little") % FEATURES
+
+
+class CatalogIndex:
+    def __init__(self, shoes: List[dict]):
+        self.catalog = compile_catalog(shoes)
+        self.shoes = self.catalog.records
+        self.types = [set(_tokens(t)) for t in self.catalog.types]
+        self.name_tokens = [set(_tokens(s["name"])) for s in self.shoes]
+        # a bare number in a question is a size, price or weight far more
+        # often than a model number, so numbers alone never match a name
+        self._all_name_tokens = {
+            t
+            for t in set().union(*self.name_tokens) - _STOP_WORDS - _TYPE_WORDS
+            if not t.isdigit()
+        }
+
+        counts = np.zeros((len(self.shoes), FEATURES), dtype=np.float32)
+        for row, text in enumerate(self.catalog.texts):
+            for token in _tokens(text):
+                counts[row, _feature(token)] += 1
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = np.log((1 + len(self.shoes)) / (1 + document_frequency)) + 1
+        self.vectors = self._normalize(np.log1p(counts) * self.idf)
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _query_vector(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(FEATURES, dtype=np.float32)
+        for token in tokens:
+            vector[_feature(token)] += 1
+        return self._normalize(np.log1p(vector) * self.idf)
+
+    def _filter_mask(self, query: str) -> np.ndarray:
+        mask = np.ones(len(self.shoes), dtype=bool)
+
+        # each filter only applies if it leaves something to recommend
+        def narrow(candidate: np.ndarray):
+            nonlocal mask
+            if (mask & candidate).any():
+                mask &= candidate
+
+        query = query.lower()
+        price = _PRICE_CEILING.search(query)
+        weight = _WEIGHT_CEILING.search(query)
+        # words of a price or weight ceiling ("max 150") are not shoe names
+        query = _PRICE_CEILING.sub(" ", _WEIGHT_CEILING.sub(" ", query))
+        tokens = set(_tokens(query))
+
+        names = tokens & self._all_name_tokens
+        if names:
+            narrow(np.array([bool(names & n) for n in self.name_tokens]))
+
+        types = tokens & _TYPE_WORDS
+        if types:
+            narrow(np.array([types <= t for t in self.types]))
+
+        if price:
+            narrow(self.catalog.mask(price=(None, float(price.group(1)))))
+        if weight:
+            narrow(self.catalog.mask(weight_oz=(None, float(weight.group(1)))))
+        return mask
+
+    def search(self, query: str, k: int = 3) -> List[dict]:
+        tokens = [t for t in _tokens(query) if t not in _STOP_WORDS]
+        if not self.shoes or not tokens:
+            return []
+        mask = self._filter_mask(query)
+        scores = np.where(mask, self.vectors @ self._query_vector(tokens), -np.inf)
+        k = min(k, int(mask.sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # with no filter in play, only shoes that share words with the query
+        filtered = not mask.all()
+        return [self.shoes[i] for i in top if filtered or scores[i] > 0]
+
+
+def render_shoes(shoes: List[dict]) -> Optional[str]:
+    if not shoes:
+        return None
+    lines = ["Relevant shoes from our catalog:"]
+    for shoe in shoes:
+        details = ", ".join(f"{k}: {v}" for k, v in specs(shoe).items())
+        lines.append(
+            f"- {shoe['name']} ({shoe['price']}, {shoe['ranking']}). {details}"
+        )
+    return "\n".join(lines)
+
+
+async def load_collection_records(zep, collection_name: str) -> List[Dict]:
+    """Fetch the shoe records stored in the metadata of ingest.py's documents."""
+    page = await zep.document.search(
+        collection_name,
+        metadata={"where": {"jsonpath": f'$[*] ? (@.catalog == "{CATALOG_TAG}")'}},
+        limit=1000,
+    )
+    return [
+        r.metadata["record"]
+        for r in page.results or []
+        if r.metadata and "record" in r.metadata
+    ]
+
+
+async def sync_with_collection(
+    holder: dict,
+    zep,
+    collection_name: str,
+    interval: float = 300.0,
+):
+    """Rebuild `holder["index"]` whenever the remote collection changes."""
+    version = None
+    while True:
+        try:
+            collection = await zep.document.get_collection(collection_name)
+            current = (collection.updated_at, collection.document_count)
+            if current != version:
+                records = await load_collection_records(zep, collection_name)
+                if records:
+                    holder["index"] = CatalogIndex(records)
+                    logger.info(f"Reloaded {len(records)} shoes from {collection_name}")
+                version = current
+        except Exception as e:
+            logger.warning(f"Catalog sync with {collection_name} failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,130 @@
+""" Compiles shoe_data records into embedding text and numeric columns.
+
+    `compile_catalog(shoes)` returns a `CompiledCatalog` with, for each
+    shoe, a compact canonical text to embed (no dict syntax, empty fields
+    dropped) and typed NumPy columns for price, weight, drop and stack
+    heights. Each column is parsed with one regex pass over all of its
+    values joined together, rather than one parse per value.
+
+    The columns support filtered search both in process (`mask`) and in
+    Zep, where `metadata` stores them with each document and
+    `zep_metadata_filter` builds the matching JSONPath filter.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# column -> spec it is parsed from ("price" is a top-level field)
+NUMERIC_COLUMNS = {
+    "price": "price",
+    "weight_oz": "Weight",
+    "drop_mm": "Drop",
+    "heel_stack_mm": "Heel Stack",
+    "forefoot_stack_mm": "Forefoot Stack",
+}
+
+# the first number on each line; a line without one yields an empty group
+_FIRST_NUMBER = re.compile(r"^[^\d\n]*(\d+(?:\.\d+)?)?[^\n]*$", re.MULTILINE)
+
+
+def specs(shoe: dict) -> Dict[str, str]:
+    # road shoes list "key_specs", trail shoes "specifications"
+    return shoe.get("key_specs") or shoe.get("specifications") or {}
+
+
+def canonical_text(shoe: dict) -> str:
+    lines = [
+        " | ".join(
+            v for v in (shoe["name"], shoe.get("ranking"), shoe.get("price")) if v
+        )
+    ]
+    spec_line = ", ".join(f"{k}: {v}" for k, v in specs(shoe).items())
+    if spec_line:
+        lines.append(spec_line)
+    if shoe.get("pros"):
+        lines.append("Pros: " + "; ".join(shoe["pros"]))
+    if shoe.get("cons"):
+        lines.append("Cons: " + "; ".join(shoe["cons"]))
+    if shoe.get("commentary"):
+        lines.append(shoe["commentary"])
+    return "\n".join(lines)
+
+
+def parse_column(values: List[Optional[str]]) -> np.ndarray:
+    """First number in each value, NaN where there is none."""
+    joined = "\n".join((v or "").replace("\n", " ") for v in values)
+    found = np.array(_FIRST_NUMBER.findall(joined)[: len(values)], dtype=object)
+    return np.where(found == "", "nan", found).astype(np.float64)
+
+
+@dataclass
+class CompiledCatalog:
+    records: List[dict]
+    texts: List[str]
+    types: List[str]
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def mask(self, **ranges: Tuple[Optional[float], Optional[float]]) -> np.ndarray:
+        """Rows whose columns fall within the given (min, max) ranges.
+
+        e.g. `catalog.mask(price=(None, 150), drop_mm=(4, 8))`. Rows with no
+        value for a constrained column are excluded.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for column, (low, high) in ranges.items():
+            values = self.columns[column]
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        return keep
+
+    def metadata(self, row: int) -> dict:
+        numbers = {
+            column: float(values[row])
+            for column, values in self.columns.items()
+            if not np.isnan(values[row])
+        }
+        return {
+            "catalog": "shoes",
+            "type": self.types[row],
+            **numbers,
+            # the full record lets app.py rebuild its catalog from Zep
+            "record": self.records[row],
+        }
+
+
+def compile_catalog(shoes: List[dict]) -> CompiledCatalog:
+    all_specs = [specs(shoe) for shoe in shoes]
+    columns = {
+        column: parse_column(
+            [shoe.get("price") for shoe in shoes]
+            if source == "price"
+            else [s.get(source) for s in all_specs]
+        )
+        for column, source in NUMERIC_COLUMNS.items()
+    }
+    return CompiledCatalog(
+        records=list(shoes),
+        texts=[canonical_text(shoe) for shoe in shoes],
+        types=[s.get("Type", "") for s in all_specs],
+        columns=columns,
+    )
+
+
+def zep_metadata_filter(**ranges: Tuple[Optional[float], Optional[float]]) -> dict:
+    """A Zep document search `metadata` filter for the given column ranges."""
+    conditions = ['@.catalog == "shoes"']
+    for column, (low, high) in ranges.items():
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if low is not None:
+            conditions.append(f"@.{column} >= {float(low)}")
+        if high is not None:
+            conditions.append(f"@.{column} <= {float(high)}")
+    return {"where": {"jsonpath": f'$[*] ? ({" && ".join(conditions)})'}}
@@ -0,0 +1,80 @@
+""" Transparent proxies that intercept a client's async method calls.
+
+    `wrap_client(client, "zep", around)` returns an object that behaves like
+    `client`, except that every async method reached through it, however
+    deeply nested (e.g. `zep.memory.get`), is run through
+    `around(operation, call)`. `operation` is the dotted path of the method,
+    such as "zep.memory.get", and `call` is a no-argument coroutine function
+    that performs the original call.
+"""
+import functools
+import inspect
+from typing import Any, Awaitable, Callable
+
+Around = Callable[[str, Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+_PLAIN_TYPES = (str, bytes, int, float, bool, dict, list, tuple, set, type(None))
+
+
+class ClientProxy:
+    def __init__(self, target: Any, path: str, around: Around):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_path", path)
+        object.__setattr__(self, "_around", around)
+        object.__setattr__(self, "_children", {})
+
+    def __getattr__(self, name: str) -> Any:
+        children = object.__getattribute__(self, "_children")
+        if name in children:
+            return children[name]
+
+        target = object.__getattribute__(self, "_target")
+        value = getattr(target, name)
+        if name.startswith("_") or isinstance(value, _PLAIN_TYPES):
+            return value
+
+        path = f"{object.__getattribute__(self, '_path')}.{name}"
+        around = object.__getattribute__(self, "_around")
+        if callable(value):
+            wrapped = _wrap_method(value, path, around)
+        else:
+            wrapped = ClientProxy(value, path, around)
+        children[name] = wrapped
+        return wrapped
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(object.__getattribute__(self, "_target"), name, value)
+
+    def __repr__(self) -> str:
+        return f"ClientProxy({object.__getattribute__(self, '_target')!r})"
+
+
+def _wrap_method(method: Callable, path: str, around: Around) -> Callable:
+    lazy = inspect.iscoroutinefunction(method) or getattr(method, "_intercepted", False)
+
+    # Not every async method is a coroutine function (the OpenAI SDK wraps
+    # them in plain decorators), so intercept any call that returns an
+    # awaitable and pass everything else through untouched. Known async
+    # methods are only called once `around` asks for it, so a call that is
+    # cancelled while `around` waits leaves no coroutine unawaited.
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if lazy:
+            return around(path, lambda: method(*args, **kwargs))
+        result = method(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return around(path, lambda: result)
+        return result
+
+    wrapper._intercepted = True
+    return wrapper
+
+
+def wrap_client(client: Any, name: str, around: Around) -> Any:
+    return ClientProxy(client, name, around)
+
+
+def unwrap_client(client: Any) -> Any:
+    while isinstance(client, ClientProxy):
+        client = object.__getattribute__(client, "_target")
+    return client
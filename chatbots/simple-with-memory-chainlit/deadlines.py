@@ -0,0 +1,85 @@
+""" Per-turn latency budgets and hedged requests.
+
+    `turn_budget(seconds)` sets a deadline in a context variable, so every
+    call made while handling a turn, including from tasks it starts, can ask
+    `remaining()` how much of the turn's budget is left.
+
+    `hedged(call, hedge_after, timeout)` runs `call()` and, if it has not
+    finished after `hedge_after` seconds, starts a duplicate and returns
+    whichever finishes first. The slower attempt is cancelled with the
+    `HEDGE_LOST` message, which tells the limiter not to count it as a slow
+    or failed call. It raises `asyncio.TimeoutError` if neither finishes
+    within `timeout`.
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+# cancellation message for the attempt that lost a hedge race
+HEDGE_LOST = "hedge lost"
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+@contextmanager
+def turn_budget(seconds: Optional[float]):
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None if there is no budget."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+async def hedged(
+    call: Callable[[], Awaitable[Any]],
+    hedge_after: Optional[float],
+    timeout: Optional[float] = None,
+) -> Any:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+
+    def time_left(limit: Optional[float] = None) -> Optional[float]:
+        left = None if deadline is None else max(deadline - loop.time(), 0.0)
+        if limit is None:
+            return left
+        return limit if left is None else min(limit, left)
+
+    attempts = {asyncio.ensure_future(call())}
+    hedge_pending = hedge_after is not None
+    error: Optional[BaseException] = None
+    try:
+        while attempts:
+            wait = time_left(hedge_after if hedge_pending else None)
+            done, _ = await asyncio.wait(
+                attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED
+            )
+            for attempt in done:
+                attempts.discard(attempt)
+                if attempt.exception() is None:
+                    for loser in attempts:
+                        loser.cancel(HEDGE_LOST)
+                    return attempt.result()
+                error = attempt.exception()
+
+            if deadline is not None and loop.time() >= deadline:
+                raise asyncio.TimeoutError()
+            # hedge once, either because the first attempt is slow or failed
+            if hedge_pending and (not done or not attempts):
+                hedge_pending = False
+                attempts.add(asyncio.ensure_future(call()))
+        raise error
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
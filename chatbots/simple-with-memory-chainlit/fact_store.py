@@ -0,0 +1,118 @@
+""" Session-scoped store of Zep facts with incremental rendering.
+
+    `FactStore.render` takes the facts returned with each memory read and
+    applies only the difference from the previous turn. Facts keep the
+    order in which they were first seen, new facts are appended and
+    near-duplicates are dropped, so the rendered block only changes when
+    the facts really do, and then only at its end. That keeps the prompt
+    prefix byte-stable across turns, which lets provider-side prompt
+    caching kick in, and means an unchanged block is reused as is.
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional, Sequence, Set
+
+from zep_cloud.types import Fact
+
+FACTS_HEADER = "Facts about the user:"
+
+_WORD = re.compile(r"[a-z0-9$]+(?:\.[0-9]+)?")
+
+
+def _fact_key(fact: Fact) -> str:
+    if fact.uuid_:
+        return fact.uuid_
+    text = (fact.fact or "").encode("utf-8")
+    return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+class FactStore:
+    def __init__(self, similarity_threshold: float = 0.9):
+        self.similarity_threshold = similarity_threshold
+        # fact key -> fact text, in first-seen order
+        self._facts: Dict[str, str] = {}
+        self._words: Dict[str, Set[str]] = {}
+        # keys of incoming facts dropped as near-duplicates of a kept fact
+        self._duplicates: Set[str] = set()
+        self._rendered: Optional[str] = None
+        self._last_input: Optional[Sequence[Fact]] = None
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    @property
+    def rendered(self) -> Optional[str]:
+        return self._rendered
+
+    def to_dict(self) -> dict:
+        """State needed to carry on rendering in another process."""
+        return {
+            "facts": list(self._facts.items()),
+            "duplicates": sorted(self._duplicates),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, similarity_threshold: float = 0.9) -> "FactStore":
+        store = cls(similarity_threshold)
+        store._facts = dict(data["facts"])
+        store._words = {key: _words(text) for key, text in store._facts.items()}
+        store._duplicates = set(data["duplicates"])
+        store._rendered = store._render_all()
+        return store
+
+    def render(self, facts: Optional[Sequence[Fact]]) -> Optional[str]:
+        """Apply the latest facts and return the facts block for the prompt."""
+        # memory reads served from the cache return the very same list
+        if facts is self._last_input and facts is not None:
+            return self._rendered
+        self._last_input = facts
+
+        incoming = {_fact_key(f): f.fact for f in facts or [] if f.fact}
+        removed = [k for k in self._facts if k not in incoming]
+        for key in removed:
+            del self._facts[key]
+            del self._words[key]
+        if removed:
+            # a fact suppressed as a duplicate may now be the only copy
+            self._duplicates.clear()
+        else:
+            self._duplicates &= incoming.keys()
+
+        added = [
+            k for k in incoming if k not in self._facts and k not in self._duplicates
+        ]
+
+        appended: List[str] = []
+        for key in added:
+            text = incoming[key]
+            words = _words(text)
+            if self._is_near_duplicate(words):
+                self._duplicates.add(key)
+                continue
+            self._facts[key] = text
+            self._words[key] = words
+            appended.append(text)
+
+        if removed or self._rendered is None:
+            self._rendered = self._render_all()
+        elif appended:
+            self._rendered = "\n".join([self._rendered, *appended])
+        return self._rendered
+
+    def _is_near_duplicate(self, words: Set[str]) -> bool:
+        if not words:
+            return False
+        for existing in self._words.values():
+            union = len(words | existing)
+            if union and len(words & existing) / union >= self.similarity_threshold:
+                return True
+        return False
+
+    def _render_all(self) -> Optional[str]:
+        if not self._facts:
+            return None
+        return "\n".join([FACTS_HEADER, *self._facts.values()])
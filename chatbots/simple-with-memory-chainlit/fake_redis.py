@@ -0,0 +1,122 @@
+""" A local Redis-compatible stand-in for the shared session cache.
+
+    Implements just the commands shared_cache.py uses (PING, GET, SET with
+    PX, DEL, INCR, PUBLISH and SUBSCRIBE) over the Redis protocol, so
+    several app workers can share a cache offline. Nothing is persisted.
+
+    python fake_redis.py --port 6390
+    CACHE_BACKEND=redis://127.0.0.1:6390 chainlit run app.py
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values: Dict[bytes, Tuple[Optional[float], bytes]] = {}
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+    def execute(self, writer: asyncio.StreamWriter, command: list):
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return "PONG"
+        if name == b"GET":
+            return self._get(args[0])
+        if name == b"SET":
+            expires = None
+            if len(args) >= 4 and args[2].upper() == b"PX":
+                expires = time.monotonic() + int(args[3]) / 1000
+            self.values[args[0]] = (expires, args[1])
+            return "OK"
+        if name == b"DEL":
+            return sum(1 for key in args if self.values.pop(key, None) is not None)
+        if name == b"INCR":
+            entry = self.values.get(args[0])
+            value = int(self._get(args[0]) or 0) + 1
+            self.values[args[0]] = (entry[0] if entry else None, b"%d" % value)
+            return value
+        if name == b"PUBLISH":
+            subscribers = self.channels.get(args[0], set())
+            message = encode([b"message", args[0], args[1]])
+            for subscriber in subscribers:
+                subscriber.write(message)
+            return len(subscribers)
+        if name == b"SUBSCRIBE":
+            for i, channel in enumerate(args, 1):
+                self.channels[channel].add(writer)
+                writer.write(encode([b"subscribe", channel, i]))
+            return None
+        raise ValueError(f"unknown command '{name.decode()}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    continue
+                command = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    command.append((await reader.readexactly(length + 2))[:-2])
+                try:
+                    reply = self.execute(writer, command)
+                    if command[0].upper() != b"SUBSCRIBE":
+                        writer.write(encode(reply))
+                except Exception as e:
+                    writer.write(b"-ERR %s\r\n" % str(e).encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.channels.values():
+                subscribers.discard(writer)
+            writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6390) -> asyncio.AbstractServer:
+    return await asyncio.start_server(FakeRedis().handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
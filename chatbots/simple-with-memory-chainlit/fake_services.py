@@ -0,0 +1,305 @@
+""" Local stand-ins for the Zep Cloud and OpenAI APIs used by app.py.
+
+    This serves the subset of the Zep v2 REST API that the chatbot calls
+    (users, sessions, memory, messages) and OpenAI's chat completions,
+    including streaming, and embeddings endpoints from a single FastAPI
+    app. Each group of endpoints gets a configurable log-normal latency and
+    error rate, so the app can be load tested offline with realistic tail
+    behaviour.
+
+    Point the app at it with:
+
+        ZEP_API_URL=http://127.0.0.1:8765
+        OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+    python fake_services.py --port 8765 --zep-latency 0.05:0.4 --openai-latency 0.3:2.0
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "Thanks for the details! Based on what you've told me, the Hoka Mach 5 is a"
+    " light, cushioned neutral road shoe that would suit your running, and it"
+    " comes in a range of sizes and widths. Would you like to hear about"
+    " alternatives from Nike or Adidas as well?"
+)
+
+
+@dataclass
+class Behaviour:
+    """Latency and failure profile for a group of endpoints."""
+
+    median: float = 0.05
+    p99: float = 0.25
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    def latency(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        # log-normal with the given median and 99th percentile
+        sigma = max(math.log(max(self.p99, self.median) / self.median), 0) / 2.326
+        return random.lognormvariate(math.log(self.median), sigma)
+
+    async def apply(self):
+        await asyncio.sleep(self.latency())
+        if random.random() < self.error_rate:
+            return JSONResponse(
+                {"message": "injected failure"}, status_code=self.error_status
+            )
+        return None
+
+
+def fake_embedding(text: str, dimensions: int = 256) -> List[float]:
+    """Hashed bag-of-words vector, so similar texts get similar embeddings."""
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.strip(".,!?").encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def parse_latency(value: str) -> tuple[float, float]:
+    median, _, p99 = value.partition(":")
+    return float(median), float(p99 or median)
+
+
+def create_app(
+    zep: Behaviour = None,
+    openai: Behaviour = None,
+    token_delay: float = 0.01,
+) -> FastAPI:
+    zep = zep or Behaviour()
+    openai = openai or Behaviour(median=0.3, p99=1.5, error_status=429)
+    app = FastAPI()
+    users: Dict[str, dict] = {}
+    sessions: Dict[str, dict] = {}
+    messages: Dict[str, List[dict]] = defaultdict(list)
+
+    def now() -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    @app.post("/api/v2/users")
+    async def add_user(request: Request):
+        if failure := await zep.apply():
+            return failure
+        body = await request.json()
+        user = {**body, "uuid": str(uuid.uuid4()), "created_at": now()}
+        users[body["user_id"]] = user
+        return user
+
+    @app.get("/api/v2/users/{user_id}")
+    async def get_user(user_id: str):
+        if failure := await zep.apply():
+            return failure
+        if user_id not in users:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        return users[user_id]
+
+    @app.patch("/api/v2/users/{user_id}")
+    async def update_user(user_id: str, request: Request):
+        if failure := await zep.apply():
+            return failure
+        if user_id not in users:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        body = await request.json()
+        users[user_id].update({k: v for k, v in body.items() if v is not None})
+        return users[user_id]
+
+    @app.delete("/api/v2/users/{user_id}")
+    async def delete_user(user_id: str):
+        if failure := await zep.apply():
+            return failure
+        if users.pop(user_id, None) is None:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        for session_id in [
+            s for s, session in sessions.items() if session.get("user_id") == user_id
+        ]:
+            sessions.pop(session_id)
+            messages.pop(session_id, None)
+        return {"message": "OK"}
+
+    @app.post("/api/v2/sessions")
+    async def add_session(request: Request):
+        if failure := await zep.apply():
+            return failure
+        body = await request.json()
+        session = {**body, "uuid": str(uuid.uuid4()), "created_at": now()}
+        sessions[body["session_id"]] = session
+        return session
+
+    @app.post("/api/v2/sessions/{session_id}/memory")
+    async def add_memory(session_id: str, request: Request):
+        if failure := await zep.apply():
+            return failure
+        body = await request.json()
+        for message in body.get("messages", []):
+            messages[session_id].append(
+                {**message, "uuid": str(uuid.uuid4()), "created_at": now()}
+            )
+        return {"message": "OK"}
+
+    @app.get("/api/v2/sessions/{session_id}/memory")
+    async def get_memory(session_id: str, request: Request):
+        if failure := await zep.apply():
+            return failure
+        # the SDK sends unset parameters as empty strings
+        lastn = int(request.query_params.get("lastn") or 12)
+        session_messages = messages[session_id]
+        # stand-in "facts": one per user message, rated by recency
+        user_messages = [m for m in session_messages if m.get("role_type") == "user"]
+        facts = [
+            {
+                "uuid": m["uuid"],
+                "fact": f"The user said: {m['content']}",
+                "rating": 1.0 - i / max(len(user_messages), 1),
+                "created_at": m["created_at"],
+            }
+            for i, m in enumerate(reversed(user_messages))
+        ]
+        return {
+            "messages": session_messages[-lastn:],
+            "relevant_facts": facts,
+        }
+
+    @app.get("/api/v2/sessions/{session_id}/messages")
+    async def get_messages(session_id: str, request: Request):
+        if failure := await zep.apply():
+            return failure
+        limit = int(request.query_params.get("limit") or 100)
+        cursor = int(request.query_params.get("cursor") or 1)
+        session_messages = messages[session_id]
+        page = session_messages[(cursor - 1) * limit : cursor * limit]
+        return {
+            "messages": page,
+            "row_count": len(page),
+            "total_count": len(session_messages),
+        }
+
+    def completion_chunk(completion_id: str, model: str, **fields) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [],
+            **fields,
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        if failure := await openai.apply():
+            return failure
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = REPLY.split(" ")
+        prompt_tokens = sum(len(m["content"]) // 4 for m in body["messages"])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": REPLY},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        async def stream():
+            for i, token in enumerate(tokens):
+                content = token if i == 0 else f" {token}"
+                yield completion_chunk(
+                    completion_id,
+                    model,
+                    choices=[
+                        {
+                            "index": 0,
+                            "delta": {"content": content},
+                            "finish_reason": None,
+                        }
+                    ],
+                )
+                await asyncio.sleep(token_delay)
+            yield completion_chunk(
+                completion_id,
+                model,
+                choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            )
+            if body.get("stream_options", {}).get("include_usage"):
+                yield completion_chunk(completion_id, model, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        if failure := await openai.apply():
+            return failure
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--zep-latency", default="0.05:0.25", help="median:p99 seconds")
+    parser.add_argument("--zep-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--openai-latency", default="0.3:1.5", help="median:p99 seconds"
+    )
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    app = create_app(
+        zep=Behaviour(*parse_latency(args.zep_latency), args.zep_error_rate),
+        openai=Behaviour(
+            *parse_latency(args.openai_latency), args.openai_error_rate, 429
+        ),
+        token_delay=args.token_delay,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
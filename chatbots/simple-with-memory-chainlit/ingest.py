@@ -1,10 +1,26 @@
 # Ingest Documents into a Zep Collection
+#
+# Re-runs only upload what changed. A local manifest records the content hash
+# and Zep document uuid of every shoe already in the collection. Shoes that are
+# new or whose content changed are uploaded in batches, several at a time, and
+# documents for removed or replaced shoes are deleted. The manifest is saved
+# after every batch, so an interrupted run picks up where it left off.
+#
+#   python ingest.py --batch-size 20 --concurrency 4
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+from typing import Dict, Iterator, List
 
+from catalog_compiler import compile_catalog
 from dotenv import find_dotenv, load_dotenv
 from shoe_data import shoes
 
-from zep_cloud.langchain import ZepVectorStore
+from zep_cloud.client import AsyncZep
+from zep_cloud.errors import NotFoundError
+from zep_cloud.types import CreateDocumentRequest
 
 load_dotenv(dotenv_path=find_dotenv())
 
@@ -16,14 +32,166 @@ if ZEP_API_KEY is None:
     )
 
 ZEP_COLLECTION_NAME = "shoe_data"
+MANIFEST_PATH = os.environ.get("ZEP_INGEST_MANIFEST", ".ingest_manifest.json")
 
-texts = [str(shoe) for shoe in shoes]
 
-# Add to vectorDB
-vectorstore = ZepVectorStore.from_texts(
-    texts=texts,
-    collection_name=ZEP_COLLECTION_NAME,
-    api_key=ZEP_API_KEY,
-)
+def catalog_documents(records: List[dict]) -> Iterator[CreateDocumentRequest]:
+    # Shoes are embedded as compact canonical text, and their numeric specs
+    # (price, weight, drop, stack heights) are stored as filterable metadata
+    catalog = compile_catalog(records)
+    for row, shoe in enumerate(catalog.records):
+        yield CreateDocumentRequest(
+            document_id=shoe["name"],
+            content=catalog.texts[row],
+            metadata=catalog.metadata(row),
+        )
 
-print(f"Added {len(shoes)} documents to {ZEP_COLLECTION_NAME}...")
+
+def content_hash(document: CreateDocumentRequest) -> str:
+    payload = json.dumps(
+        [document.content, document.metadata], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """document_id -> {"hash", "uuid"} for documents already in the collection."""
+
+    def __init__(self, path: str, collection_name: str):
+        self.path = path
+        self.collection_name = collection_name
+        self.documents: Dict[str, dict] = {}
+        # uuids of replaced or removed documents that still have to be deleted
+        self.stale_uuids: List[str] = []
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("collection") == collection_name:
+                self.documents = data["documents"]
+                self.stale_uuids = data.get("stale_uuids", [])
+
+    def save(self):
+        data = {
+            "collection": self.collection_name,
+            "documents": self.documents,
+            "stale_uuids": self.stale_uuids,
+        }
+        # write-then-rename, so an interrupted save leaves the old manifest
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def batched(items: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def with_retries(call, retries: int = 3, delay: float = 1.0):
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"Retrying after error: {e}")
+            await asyncio.sleep(delay * 2**attempt)
+
+
+async def ensure_collection(zep: AsyncZep, manifest: Manifest):
+    try:
+        await zep.document.get_collection(ZEP_COLLECTION_NAME)
+    except NotFoundError:
+        await zep.document.add_collection(
+            ZEP_COLLECTION_NAME, description="Running shoe catalog"
+        )
+        # nothing we uploaded before can still be there
+        manifest.documents.clear()
+        manifest.stale_uuids.clear()
+
+
+async def ingest(zep: AsyncZep, records: List[dict], batch_size: int, concurrency: int):
+    manifest = Manifest(MANIFEST_PATH, ZEP_COLLECTION_NAME)
+    await ensure_collection(zep, manifest)
+
+    seen = set()
+
+    def changed_documents():
+        for document in catalog_documents(records):
+            seen.add(document.document_id)
+            digest = content_hash(document)
+            known = manifest.documents.get(document.document_id)
+            if known is None or known["hash"] != digest:
+                yield document, digest
+
+    uploaded = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(batch):
+        nonlocal uploaded
+        async with semaphore:
+            uuids = await with_retries(
+                lambda: zep.document.add_documents(
+                    ZEP_COLLECTION_NAME, request=[d for d, _ in batch]
+                )
+            )
+        for (document, digest), uuid in zip(batch, uuids):
+            previous = manifest.documents.get(document.document_id)
+            if previous is not None:
+                manifest.stale_uuids.append(previous["uuid"])
+            manifest.documents[document.document_id] = {"hash": digest, "uuid": uuid}
+        uploaded += len(batch)
+        manifest.save()
+
+    # batches are only built as upload slots free up
+    tasks = set()
+    for batch in batched(changed_documents(), batch_size):
+        if len(tasks) >= concurrency:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        tasks.add(asyncio.ensure_future(upload(batch)))
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    removed = [doc_id for doc_id in manifest.documents if doc_id not in seen]
+    for doc_id in removed:
+        manifest.stale_uuids.append(manifest.documents.pop(doc_id)["uuid"])
+    manifest.save()
+
+    deleted = 0
+    while manifest.stale_uuids:
+        batch = manifest.stale_uuids[:batch_size]
+        await with_retries(
+            lambda: zep.document.batch_delete_documents(
+                ZEP_COLLECTION_NAME, request=batch
+            )
+        )
+        del manifest.stale_uuids[: len(batch)]
+        deleted += len(batch)
+        manifest.save()
+
+    print(
+        f"Uploaded {uploaded} and deleted {deleted} documents in"
+        f" {ZEP_COLLECTION_NAME} ({len(manifest.documents)} total)..."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest shoe_data into Zep")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    zep = AsyncZep(api_key=ZEP_API_KEY)
+    asyncio.run(ingest(zep, shoes, args.batch_size, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+""" Process-wide adaptive concurrency limits for calls to a dependency.
+
+    All chat sessions share one `AdaptiveLimiter` per dependency. It bounds
+    the number of calls in flight and adjusts that bound AIMD-style: the
+    limit grows by about one per limit's worth of successful calls and is
+    cut multiplicatively, at most once per round trip, when a call is rate
+    limited (429/503) or takes much longer than the long-run average. An
+    optional token bucket caps the request rate on top of that.
+
+    Callers waiting for a slot are served by priority class, then in arrival
+    order. The class comes from a context variable, so code marks a block of
+    work with `with priority(Priority.BACKGROUND): ...` and every call made
+    inside it, including from tasks it starts, queues behind interactive
+    turns.
+
+    `limit_client(client, "zep", limiter)` routes every async method of a
+    client through its limiter.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from client_proxy import wrap_client
+from deadlines import HEDGE_LOST
+
+RATE_LIMITED_STATUSES = (429, 503)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def priority(value: Priority):
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) in RATE_LIMITED_STATUSES
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.7,
+        # a call this many times slower than the average is a congestion signal
+        tolerance: float = 2.5,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.clock = clock
+        self.bucket = TokenBucket(rate, burst, clock) if rate else None
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.decreases = 0
+        self._average_latency: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+    async def acquire(self, priority: Optional[Priority] = None):
+        if priority is None:
+            priority = current_priority()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just as we were cancelled, so hand the slot back
+                self._release_slot()
+            raise
+
+    def release(self, latency: float, rate_limited: bool = False):
+        self._release_slot()
+        self._adjust(latency, rate_limited)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # cancelled while waiting
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _adjust(self, latency: float, rate_limited: bool):
+        average = self._average_latency
+        congested = rate_limited or (
+            average is not None and latency > self.tolerance * average
+        )
+        if rate_limited:
+            self.rate_limited += 1
+        else:
+            self._average_latency = (
+                latency if average is None else 0.95 * average + 0.05 * latency
+            )
+
+        now = self.clock()
+        if congested:
+            # one cut per round trip, however many calls saw the same burst
+            if now - self._last_decrease > (average or latency):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreases += 1
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        await self.acquire()
+        started = self.clock()
+        rate_limited = False
+        try:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+                started = self.clock()
+            return await call()
+        except asyncio.CancelledError as e:
+            if e.args == (HEDGE_LOST,):
+                # the duplicate won the race; this call says nothing about load
+                self._release_slot()
+                started = None
+            raise
+        except Exception as e:
+            rate_limited = is_rate_limited(e)
+            raise
+        finally:
+            if started is not None:
+                self.release(self.clock() - started, rate_limited)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rate_limited": self.rate_limited,
+            "decreases": self.decreases,
+        }
+
+
+def limit_client(client: Any, name: str, limiter: AdaptiveLimiter) -> Any:
+    async def around(operation, call):
+        return await limiter.run(call)
+
+    return wrap_client(client, name, around)
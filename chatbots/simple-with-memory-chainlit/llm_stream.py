@@ -0,0 +1,75 @@
+""" Streaming chat completions with per-turn latency statistics. """
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from openai import AsyncOpenAI
+
+
+@dataclass
+class StreamResult:
+    content: str
+    # seconds from sending the request to receiving the first content token
+    time_to_first_token: Optional[float]
+    total_time: float
+    completion_tokens: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.time_to_first_token is None:
+            return 0.0
+        generation_time = self.total_time - self.time_to_first_token
+        if generation_time <= 0:
+            return 0.0
+        return self.completion_tokens / generation_time
+
+
+async def stream_completion(
+    client: AsyncOpenAI,
+    on_token: Callable[[str], Awaitable[None]],
+    **create_kwargs,
+) -> StreamResult:
+    """Run a streaming chat completion, passing each content delta to `on_token`.
+
+    The deltas are also collected into one buffer, which becomes
+    `StreamResult.content`.
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    deltas = 0
+    usage_tokens = None
+
+    stream = await client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **create_kwargs,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage_tokens = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if not token:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(token)
+            deltas += 1
+            await on_token(token)
+    finally:
+        # an abandoned stream would otherwise hold its connection open
+        await stream.close()
+
+    finished = time.perf_counter()
+    return StreamResult(
+        content="".join(parts),
+        time_to_first_token=(
+            first_token_at - started if first_token_at is not None else None
+        ),
+        total_time=finished - started,
+        # each delta is roughly one token when usage is not reported
+        completion_tokens=usage_tokens if usage_tokens is not None else deltas,
+    )
@@ -0,0 +1,152 @@
+""" Load generator for the Chainlit chatbot.
+
+    Runs N concurrent simulated chats straight through app.py's
+    `on_chat_start` and `on_message` handlers, each in its own Chainlit
+    HTTP context, and reports throughput and latency percentiles per turn
+    and per dependency. By default it starts fake_services.py in a
+    subprocess and points the app at it, so no Zep or OpenAI account is
+    needed.
+
+    python loadgen.py --sessions 50 --turns 5 --think-time 0.5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+
+QUESTIONS = [
+    "I'm looking for a cushioned shoe for long runs.",
+    "What would you recommend under $150?",
+    "Do any of those come in wide sizes?",
+    "How does the drop compare between them?",
+    "Which one is the lightest?",
+    "I think I'll go with the Saucony. Can you confirm the price?",
+]
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_chat(app, turns: int, think_time: float, results: dict):
+    import chainlit as cl
+    from chainlit.context import init_http_context
+
+    init_http_context()
+    started = time.perf_counter()
+    try:
+        await app.main()
+        await app.wait_until_ready()
+        results["session_start"].record(time.perf_counter() - started)
+
+        for question in random.sample(QUESTIONS, k=min(turns, len(QUESTIONS))):
+            turn_started = time.perf_counter()
+            await app.on_message(cl.Message(content=question, author="user"))
+            results["turn"].record(time.perf_counter() - turn_started)
+            results["turns"] += 1
+            await asyncio.sleep(random.expovariate(1 / think_time) if think_time else 0)
+    except Exception as e:
+        name = type(e).__name__
+        results["errors"][name] = results["errors"].get(name, 0) + 1
+    finally:
+        await app.on_chat_end()
+
+
+def print_histogram(name: str, histogram):
+    print(
+        f"{name:<40} n={histogram.count:<6}"
+        f" p50={histogram.percentile(0.5) * 1000:8.1f}ms"
+        f" p95={histogram.percentile(0.95) * 1000:8.1f}ms"
+        f" p99={histogram.percentile(0.99) * 1000:8.1f}ms"
+        f" max={histogram.max * 1000:8.1f}ms"
+    )
+
+
+async def run(args):
+    # imported here so the environment is configured before app.py reads it
+    import app
+    from metrics import LatencyHistogram
+
+    results = {
+        "session_start": LatencyHistogram(),
+        "turn": LatencyHistogram(),
+        "turns": 0,
+        "errors": {},
+    }
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited_chat():
+        async with semaphore:
+            await run_chat(app, args.turns, args.think_time, results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[limited_chat() for _ in range(args.sessions)])
+    await app.memory_writer.aclose()
+    await app.session_pool.aclose()
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{args.sessions} chats, {results['turns']} turns in {elapsed:.1f}s")
+    print(f"throughput: {results['turns'] / elapsed:.2f} turns/s")
+    print_histogram("session start", results["session_start"])
+    print_histogram("turn", results["turn"])
+    for (name, labels), histogram in sorted(app.metrics.histograms.items()):
+        label = ",".join(v for _, v in labels)
+        print_histogram(f"{name}{{{label}}}" if label else name, histogram)
+    if results["errors"]:
+        print(f"failed chats: {results['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--no-fake",
+        action="store_true",
+        help="use ZEP_API_URL/OPENAI_BASE_URL as configured,"
+        " instead of fake_services.py",
+    )
+    parser.add_argument(
+        "fake_args", nargs=argparse.REMAINDER, help="extra args for fake_services.py"
+    )
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = None
+    if not args.no_fake:
+        os.environ["ZEP_API_URL"] = f"http://127.0.0.1:{args.port}"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+        os.environ.setdefault("ZEP_API_KEY", "fake")
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        server = subprocess.Popen(
+            [sys.executable, "fake_services.py", "--port", str(args.port)]
+            + [a for a in args.fake_args if a != "--"],
+        )
+    try:
+        if server is not None:
+            asyncio.run(wait_for_port("127.0.0.1", args.port))
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
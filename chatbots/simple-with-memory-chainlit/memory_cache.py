@@ -0,0 +1,120 @@
+""" A bounded, TTL-expiring LRU cache of Zep `Memory` reads.
+
+    Entries are keyed by session and `min_rating`. The app invalidates a
+    session whenever its own `memory.add` calls complete, so the TTL only
+    has to cover changes made on the Zep side, such as newly extracted facts.
+
+    The last memory read for each session is also kept after it expires or
+    is invalidated, so `stale` can stand in for a read that fails or runs
+    out of time.
+"""
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from zep_cloud.types import Memory
+
+CacheKey = Tuple[str, Optional[float]]
+
+
+class MemoryCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[CacheKey, Tuple[float, Memory]] = OrderedDict()
+        self._keys_by_session: Dict[str, Set[CacheKey]] = {}
+        # bumped on every invalidation, so a read that was already in flight
+        # when the session changed does not repopulate the cache
+        self._generations: Dict[str, int] = {}
+        self._last_known: OrderedDict[CacheKey, Memory] = OrderedDict()
+
+    def get(self, session_id: str, min_rating: Optional[float]) -> Optional[Memory]:
+        key = (session_id, min_rating)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, session_id: str, min_rating: Optional[float], memory: Memory):
+        key = (session_id, min_rating)
+        self._entries[key] = (self.clock() + self.ttl, memory)
+        self._entries.move_to_end(key)
+        self._keys_by_session.setdefault(session_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        self._remember(key, memory)
+
+    def stale(self, session_id: str, min_rating: Optional[float]) -> Optional[Memory]:
+        """The last memory read for the session, however old."""
+        return self._last_known.get((session_id, min_rating))
+
+    def invalidate(self, session_id: str):
+        self._generations[session_id] = self._generations.get(session_id, 0) + 1
+        for key in self._keys_by_session.pop(session_id, set()):
+            self._entries.pop(key, None)
+
+    def invalidate_all(self):
+        for session_id in list(self._generations):
+            self.invalidate(session_id)
+
+    def discard(self, session_id: str):
+        """Forget a session entirely, e.g. once its chat has ended."""
+        self.invalidate(session_id)
+        del self._generations[session_id]
+        for key in [k for k in self._last_known if k[0] == session_id]:
+            del self._last_known[key]
+
+    async def fetch(
+        self,
+        session_id: str,
+        min_rating: Optional[float],
+        load: Callable[[], Awaitable[Memory]],
+    ) -> Memory:
+        """Return the cached memory, calling `load` and caching it on a miss."""
+        memory = self.get(session_id, min_rating)
+        if memory is not None:
+            return memory
+        generation = self._generations.get(session_id, 0)
+        memory = await load()
+        if self._generations.get(session_id, 0) == generation:
+            self.set(session_id, min_rating, memory)
+        else:
+            # too old to cache, but still the freshest fallback we have
+            self._remember((session_id, min_rating), memory)
+        return memory
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        keys = self._keys_by_session.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_session[key[0]]
+
+    def _remember(self, key: CacheKey, memory: Memory):
+        self._last_known[key] = memory
+        self._last_known.move_to_end(key)
+        while len(self._last_known) > self.max_entries:
+            self._last_known.popitem(last=False)
@@ -0,0 +1,233 @@
+""" Write-behind persistence of chat messages to Zep memory.
+
+    Messages are queued per session and flushed to `zep.memory.add` by a
+    background task, so the chat turn never waits on the write. Whatever is
+    queued when the flusher runs is merged into a single `memory.add` call.
+    The per-session queue is bounded: once it is full, `put` waits, pushing
+    back on the caller instead of buffering without limit.
+"""
+import asyncio
+import atexit
+import inspect
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from zep_cloud.client import AsyncZep
+from zep_cloud.types import Message
+
+logger = logging.getLogger(__name__)
+
+# Zep accepts a bounded number of messages per memory.add call
+MAX_MESSAGES_PER_ADD = 30
+
+# metadata key for the id that identifies a queued message in memory reads
+CLIENT_ID_KEY = "client_message_id"
+
+
+def tag_message(message: Message) -> Message:
+    """The message with a client-side id, added unless it already has one."""
+    if client_id(message) is not None:
+        return message
+    metadata = {**(message.metadata or {}), CLIENT_ID_KEY: uuid.uuid4().hex}
+    return message.copy(update={"metadata": metadata})
+
+
+def client_id(message: Message) -> Optional[str]:
+    return (message.metadata or {}).get(CLIENT_ID_KEY)
+
+
+class SessionWriter:
+    def __init__(
+        self,
+        zep: AsyncZep,
+        session_id: str,
+        max_pending: int = 16,
+        max_batch: int = MAX_MESSAGES_PER_ADD,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+        on_written: Optional[Callable[[str], Union[None, Awaitable[None]]]] = None,
+    ):
+        self.zep = zep
+        self.session_id = session_id
+        self.on_written = on_written
+        self.max_batch = max_batch
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[List[Message]] = asyncio.Queue(maxsize=max_pending)
+        # a queued item that did not fit into the previous batch
+        self._carry: Optional[List[Message]] = None
+        # every queued message whose memory.add has not completed yet
+        self._unacked: List[Message] = []
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def put(self, messages: List[Message]):
+        if self._closed:
+            raise RuntimeError(f"writer for session {self.session_id} is closed")
+        if not messages:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        messages = [tag_message(m) for m in messages]
+        await self._queue.put(messages)
+        self._unacked.extend(messages)
+
+    async def flush(self):
+        """Wait until every message queued so far has been written."""
+        await self._queue.join()
+
+    async def close(self):
+        self._closed = True
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def pending(self) -> List[Message]:
+        """Messages not yet acknowledged by Zep, in the order they were queued."""
+        return list(self._unacked)
+
+    async def _next_batch(self) -> tuple[List[Message], int]:
+        if self._carry is not None:
+            batch, self._carry = self._carry, None
+        else:
+            batch = await self._queue.get()
+        items = 1
+        while not self._queue.empty():
+            messages = self._queue.get_nowait()
+            if len(batch) + len(messages) > self.max_batch:
+                self._carry = messages
+                break
+            batch = batch + messages
+            items += 1
+        return batch, items
+
+    async def _run(self):
+        while True:
+            batch, items = await self._next_batch()
+            try:
+                await self._write(batch)
+                del self._unacked[: len(batch)]
+                if self.on_written is not None:
+                    await self._notify_written()
+            finally:
+                # also on cancellation, so flush() and close() cannot hang
+                for _ in range(items):
+                    self._queue.task_done()
+
+    async def _notify_written(self):
+        try:
+            written = self.on_written(self.session_id)
+            if inspect.isawaitable(written):
+                await written
+        except Exception as e:
+            logger.error(f"on_written failed for session {self.session_id}: {e}")
+
+    async def _write(self, batch: List[Message]):
+        for attempt in range(self.retries + 1):
+            try:
+                await self.zep.memory.add(session_id=self.session_id, messages=batch)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(
+                        f"Dropping {len(batch)} messages for session"
+                        f" {self.session_id} after {attempt + 1} attempts: {e}"
+                    )
+                    return
+                await asyncio.sleep(self.retry_delay * 2**attempt)
+
+
+class WriteBehindQueue:
+    """One SessionWriter per chat session, sharing a Zep client."""
+
+    def __init__(self, zep: AsyncZep, **writer_kwargs):
+        self.zep = zep
+        self.writer_kwargs = writer_kwargs
+        self._writers: Dict[str, SessionWriter] = {}
+
+    def writer(self, session_id: str) -> SessionWriter:
+        if session_id not in self._writers:
+            self._writers[session_id] = SessionWriter(
+                self.zep, session_id, **self.writer_kwargs
+            )
+        return self._writers[session_id]
+
+    async def put(self, session_id: str, messages: List[Message]):
+        await self.writer(session_id).put(messages)
+
+    async def flush(self, session_id: str):
+        if session_id in self._writers:
+            await self._writers[session_id].flush()
+
+    async def close_session(self, session_id: str):
+        writer = self._writers.pop(session_id, None)
+        if writer is not None:
+            await writer.close()
+
+    async def aclose(self):
+        await asyncio.gather(
+            *[self.close_session(session_id) for session_id in list(self._writers)]
+        )
+
+    def pending_messages(self, session_id: str) -> List[Message]:
+        if session_id not in self._writers:
+            return []
+        return self._writers[session_id].pending()
+
+    def pending(self) -> Dict[str, List[Message]]:
+        pending = {}
+        for session_id, writer in self._writers.items():
+            messages = writer.pending()
+            if messages:
+                pending[session_id] = messages
+        return pending
+
+
+def merge_pending(
+    server_messages: List[Message], pending: List[Message]
+) -> List[Message]:
+    """Overlay messages that Zep has not acknowledged onto a memory read.
+
+    `pending` must be captured before the read is issued. Any prefix of it
+    may already have been written by the time the server answers, in which
+    case those messages are in `server_messages`. They are recognised by
+    the client id they were tagged with when queued, not by their content,
+    so a repeated "ok" or "thanks" is never mistaken for one already
+    written. Pending messages without an id are always appended.
+    """
+    written = {client_id(m) for m in server_messages} - {None}
+    return list(server_messages) + [
+        m for m in pending if client_id(m) is None or client_id(m) not in written
+    ]
+
+
+def install_shutdown_flush(
+    queue: WriteBehindQueue, client_factory: Callable[[], AsyncZep]
+):
+    """Write out anything still queued when the process exits.
+
+    The server's event loop is gone by the time atexit handlers run, so the
+    leftover messages are written on a fresh loop with a fresh client.
+    """
+
+    async def _flush(pending: Dict[str, List[Message]]):
+        zep = client_factory()
+        for session_id, messages in pending.items():
+            for i in range(0, len(messages), MAX_MESSAGES_PER_ADD):
+                await zep.memory.add(
+                    session_id=session_id,
+                    messages=messages[i : i + MAX_MESSAGES_PER_ADD],
+                )
+
+    def _on_exit():
+        pending = queue.pending()
+        if not pending:
+            return
+        try:
+            asyncio.run(_flush(pending))
+        except Exception as e:
+            logger.error(f"Failed to flush queued messages on shutdown: {e}")
+
+    atexit.register(_on_exit)
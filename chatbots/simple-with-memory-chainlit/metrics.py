@@ -0,0 +1,245 @@
+""" In-process latency histograms and counters with Prometheus text export.
+
+    Latencies are kept in HDR-style log-linear histograms: values are
+    bucketed with about 1% relative precision over the whole range, so
+    percentiles stay accurate from sub-millisecond cache hits to multi-second
+    LLM calls while recording is O(1) and memory stays small.
+
+    `instrument(client, "zep")` wraps a client so that every async call made
+    through it is timed and its errors counted, labelled by operation.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from client_proxy import wrap_client
+from deadlines import HEDGE_LOST
+
+logger = logging.getLogger(__name__)
+
+# 2**SUB_BUCKET_BITS linear sub-buckets per power of two
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * HALF_SUB_BUCKETS + (value >> shift)
+
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - HALF_SUB_BUCKETS) // HALF_SUB_BUCKETS
+    mantissa = index - shift * HALF_SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Latency histogram with microsecond resolution."""
+
+    def __init__(self):
+        self._counts: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        micros = max(0, int(seconds * 1_000_000))
+        self._counts[_bucket_index(micros)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds at quantile `q` (0..1), or 0.0 if empty."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(_bucket_upper_bound(index) / 1_000_000, self.max)
+        return self.max
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metrics:
+    def __init__(self, namespace: str = "chatbot"):
+        self.namespace = namespace
+        self.histograms: Dict[Tuple[str, Labels], LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self._collectors: List[Callable[["Metrics"], None]] = []
+
+    def histogram(
+        self, name: str, labels: Optional[Dict[str, str]] = None
+    ) -> LatencyHistogram:
+        key = (name, _labels(labels))
+        if key not in self.histograms:
+            self.histograms[key] = LatencyHistogram()
+        return self.histograms[key]
+
+    def observe(
+        self, name: str, seconds: float, labels: Optional[Dict[str, str]] = None
+    ):
+        self.histogram(name, labels).record(seconds)
+
+    def inc(
+        self,
+        name: str,
+        labels: Optional[Dict[str, str]] = None,
+        value: float = 1.0,
+    ):
+        self.counters[(name, _labels(labels))] += value
+
+    def set_gauge(
+        self, name: str, value: float, labels: Optional[Dict[str, str]] = None
+    ):
+        self.gauges[(name, _labels(labels))] = value
+
+    def add_collector(self, collector: Callable[["Metrics"], None]):
+        """Register a callback that updates gauges just before each export."""
+        self._collectors.append(collector)
+
+    @asynccontextmanager
+    async def timed(self, operation: str):
+        """Time the enclosed block as `operation`, counting any errors."""
+        labels = {"operation": operation}
+        started = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError as e:
+            if e.args == (HEDGE_LOST,):
+                # cut short by the duplicate that won, so not a real latency
+                started = None
+            raise
+        except Exception as e:
+            self.inc("errors_total", {**labels, "error": type(e).__name__})
+            raise
+        finally:
+            if started is not None:
+                elapsed = time.perf_counter() - started
+                self.observe("latency_seconds", elapsed, labels)
+
+    def instrument(self, client: Any, name: str) -> Any:
+        async def around(operation, call):
+            async with self.timed(operation):
+                return await call()
+
+        return wrap_client(client, name, around)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        for collector in self._collectors:
+            collector(self)
+        lines: List[str] = []
+
+        def family(name: str) -> str:
+            return f"{self.namespace}_{name}"
+
+        by_name: Dict[str, list] = defaultdict(list)
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            by_name[name].append((labels, histogram))
+        for name, series in by_name.items():
+            full = family(name)
+            lines.append(f"# TYPE {full} summary")
+            for labels, histogram in series:
+                for q in QUANTILES:
+                    quantile_labels = labels + (("quantile", str(q)),)
+                    lines.append(
+                        f"{full}{_format_labels(quantile_labels)}"
+                        f" {histogram.percentile(q):.6f}"
+                    )
+                lines.append(f"{full}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            seen = set()
+            for (name, labels), value in sorted(values.items()):
+                full = family(name)
+                if full not in seen:
+                    lines.append(f"# TYPE {full} {kind}")
+                    seen.add(full)
+                lines.append(f"{full}{_format_labels(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+async def _handle_http(metrics: Metrics, reader, writer):
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = metrics.render().encode("utf-8")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode("ascii")
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+    """Serve `metrics.render()` over HTTP on every path, for Prometheus to scrape."""
+    return await asyncio.start_server(
+        lambda r, w: _handle_http(metrics, r, w), host, port
+    )
+
+
+async def write_metrics_file(metrics: Metrics, path: str, interval: float = 15.0):
+    """Periodically write the metrics to `path`, e.g. a node_exporter textfile."""
+    while True:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(metrics.render())
+        os.replace(tmp_path, path)
+        await asyncio.sleep(interval)
+
+
+metrics = Metrics()
+_exporters: List[Any] = []
+_exporters_started = False
+
+
+async def start_exporters(port: Optional[int] = None, path: Optional[str] = None):
+    """Start the configured exporters once per process."""
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+    if port:
+        _exporters.append(await serve_metrics(metrics, port=port))
+        logger.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+    if path:
+        _exporters.append(asyncio.create_task(write_metrics_file(metrics, path)))
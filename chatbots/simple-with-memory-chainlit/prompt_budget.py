@@ -0,0 +1,132 @@
+""" Token-budgeted prompt assembly.
+
+    The system prompt, the facts block and any per-turn context (such as
+    retrieved catalog entries) are always kept. Chat history is
+    added newest first until the model's budget is spent, and the oldest
+    turns that do not fit are replaced by Zep's session summary, when there
+    is one. Token counts are cached by content hash, so a message is only
+    tokenized the first time it is seen.
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Prompt budgets per model, well under each model's context window so that
+# latency and cost stay flat as sessions grow
+MODEL_PROMPT_BUDGETS = {
+    "gpt-4o": 6000,
+    "gpt-4o-mini": 6000,
+    "gpt-4-turbo": 6000,
+    "gpt-3.5-turbo": 3000,
+}
+DEFAULT_PROMPT_BUDGET = 3000
+
+# chat formatting adds a few tokens per message on top of its content
+TOKENS_PER_MESSAGE = 4
+
+
+class TokenCounter:
+    def __init__(self, model: str, max_entries: int = 8192):
+        self.model = model
+        self.max_entries = max_entries
+        self._counts: OrderedDict[bytes, int] = OrderedDict()
+        self._encoding = None
+        self._encoding_loaded = tiktoken is None
+
+    def _load_encoding(self):
+        # tiktoken downloads the BPE file the first time an encoding is used,
+        # so this is deferred until the first count and may fail offline
+        self._encoding_loaded = True
+        try:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"Estimating token counts, tiktoken is unavailable: {e}")
+
+    def count(self, content: str) -> int:
+        key = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+        count = self._counts.get(key)
+        if count is not None:
+            self._counts.move_to_end(key)
+            return count
+        if not self._encoding_loaded:
+            self._load_encoding()
+        if self._encoding is not None:
+            count = len(self._encoding.encode(content, disallowed_special=()))
+        else:
+            count = len(content) // 4 + 1
+        self._counts[key] = count
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return count
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count(message["content"]) + TOKENS_PER_MESSAGE
+
+
+class PromptAssembler:
+    def __init__(self, model: str, budget: Optional[int] = None):
+        self.model = model
+        self.budget = budget or MODEL_PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+        self.counter = TokenCounter(model)
+
+    def assemble(
+        self,
+        system_prompt: str,
+        history: List[Dict[str, str]],
+        facts: Optional[str] = None,
+        summary: Optional[str] = None,
+        context: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """Build an OpenAI message list that fits in the budget.
+
+        `history` is oldest first and its last entry is the message being
+        answered, which is kept even if it alone exceeds the budget.
+        `context` changes every turn, so it goes just before that message,
+        leaving the rest of the prompt prefix unchanged between turns.
+        """
+        pinned = [{"role": "system", "content": system_prompt}]
+        if facts:
+            pinned.append({"role": "user", "content": facts})
+        remaining = self.budget - sum(self.counter.message_tokens(m) for m in pinned)
+        context_message = None
+        if context:
+            context_message = {"role": "system", "content": context}
+            remaining -= self.counter.message_tokens(context_message)
+
+        summary_message = None
+        if summary:
+            summary_message = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+            }
+
+        kept: List[Dict[str, str]] = []
+        for i in range(len(history) - 1, -1, -1):
+            tokens = self.counter.message_tokens(history[i])
+            if kept and tokens > remaining:
+                # the summary stands in for everything older than this point
+                if summary_message is not None:
+                    summary_tokens = self.counter.message_tokens(summary_message)
+                    while len(kept) > 1 and summary_tokens > remaining:
+                        remaining += self.counter.message_tokens(kept.pop())
+                    if summary_tokens <= remaining:
+                        kept.append(summary_message)
+                break
+            kept.append(history[i])
+            remaining -= tokens
+
+        kept.reverse()
+        if context_message is not None:
+            kept.insert(len(kept) - 1 if kept else 0, context_message)
+        return pinned + kept
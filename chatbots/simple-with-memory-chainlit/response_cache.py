@@ -0,0 +1,124 @@
+""" Semantic cache of LLM responses backed by an in-process vector index.
+
+    Entries are keyed by the embedding of the user's last message together
+    with a hash of the context the answer depended on (the facts, catalog
+    matches and previous reply, serialized by the caller). A lookup returns
+    a cached answer when a stored entry with the same context hash is at
+    least `threshold` cosine-similar to the query. Embeddings are kept
+    normalized in a preallocated NumPy matrix, so a lookup is a single
+    matrix-vector product. Entries expire after `ttl` seconds and the least
+    recently used entry is evicted once `max_entries` is reached.
+"""
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    similarity: float
+    # how long the LLM took to produce the answer originally
+    latency: float
+
+
+def context_hash(context: Optional[str]) -> int:
+    digest = hashlib.blake2b((context or "").encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little", signed=True)
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl: float = 3600.0,
+        threshold: float = 0.95,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._vectors: Optional[np.ndarray] = None
+        self._contexts = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._occupied = np.zeros(max_entries, dtype=bool)
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._latencies = np.zeros(max_entries, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return int(self._occupied.sum())
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, context: Optional[str]) -> Optional[CachedResponse]:
+        if self._vectors is None:
+            self.misses += 1
+            return None
+        now = self.clock()
+        self._occupied &= self._expires > now
+
+        candidates = np.flatnonzero(
+            self._occupied & (self._contexts == context_hash(context))
+        )
+        if candidates.size == 0:
+            self.misses += 1
+            return None
+
+        similarities = self._vectors[candidates] @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        slot = int(candidates[best])
+        self._last_used[slot] = now
+        self.hits += 1
+        self.latency_saved += float(self._latencies[slot])
+        return CachedResponse(
+            answer=self._answers[slot],
+            similarity=float(similarities[best]),
+            latency=float(self._latencies[slot]),
+        )
+
+    def store(self, embedding, context: Optional[str], answer: str, latency: float):
+        vector = self._normalize(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), np.float32)
+
+        now = self.clock()
+        self._occupied &= self._expires > now
+        free = np.flatnonzero(~self._occupied)
+        if free.size:
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self._last_used))
+
+        self._vectors[slot] = vector
+        self._contexts[slot] = context_hash(context)
+        self._expires[slot] = now + self.ttl
+        self._last_used[slot] = now
+        self._occupied[slot] = True
+        self._answers[slot] = answer
+        self._latencies[slot] = latency
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": self.latency_saved,
+            "entries": len(self),
+        }
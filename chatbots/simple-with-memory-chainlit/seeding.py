@@ -0,0 +1,154 @@
+""" Bulk seeding of chat history into Zep sessions.
+
+    A `SeedTemplate` packs a chat history into `memory.add` batches once, by
+    payload size and message count, and can then replay those batches into
+    any number of new sessions. Every message carries a `seq` number in its
+    metadata, so the original order is recoverable even when batches are
+    sent concurrently.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from memory_writer import MAX_MESSAGES_PER_ADD
+from zep_cloud.client import AsyncZep
+from zep_cloud.types import Message
+
+# keep each memory.add request body comfortably small
+MAX_BATCH_BYTES = 32 * 1024
+
+ProgressCallback = Callable[[str, int, int], Optional[Awaitable[None]]]
+
+
+@dataclass(frozen=True)
+class SeedBatch:
+    seq: int
+    messages: List[Message]
+
+
+def _payload_size(message: Message) -> int:
+    return len(message.json().encode("utf-8"))
+
+
+def pack_messages(
+    messages: Iterable[Message],
+    max_batch_bytes: int = MAX_BATCH_BYTES,
+    max_batch_messages: int = MAX_MESSAGES_PER_ADD,
+) -> List[SeedBatch]:
+    """Number the messages and greedily pack them into ordered batches."""
+    batches: List[SeedBatch] = []
+    current: List[Message] = []
+    current_bytes = 0
+    for seq, message in enumerate(messages):
+        message = message.copy(
+            update={"metadata": {**(message.metadata or {}), "seq": seq}}
+        )
+        size = _payload_size(message)
+        if current and (
+            current_bytes + size > max_batch_bytes
+            or len(current) >= max_batch_messages
+        ):
+            batches.append(SeedBatch(seq=len(batches), messages=current))
+            current, current_bytes = [], 0
+        current.append(message)
+        current_bytes += size
+    if current:
+        batches.append(SeedBatch(seq=len(batches), messages=current))
+    return batches
+
+
+class SeedTemplate:
+    def __init__(self, batches: List[SeedBatch]):
+        self.batches = batches
+        self.message_count = sum(len(b.messages) for b in batches)
+
+    @classmethod
+    def from_history(
+        cls, history: List[dict], user_name: str, bot_name: str, **pack_kwargs
+    ) -> "SeedTemplate":
+        """Build a template from records shaped like `chat_history_shoe_purchase`."""
+        messages = [
+            Message(
+                role_type=record["role_type"],
+                role=user_name if record["role_type"] == "user" else bot_name,
+                content=record["content"],
+            )
+            for record in history
+        ]
+        return cls(pack_messages(messages, **pack_kwargs))
+
+    @classmethod
+    async def from_session(
+        cls, zep: AsyncZep, session_id: str, page_size: int = 100, **pack_kwargs
+    ) -> "SeedTemplate":
+        """Build a template by reading every message of an existing session."""
+        messages: List[Message] = []
+        cursor = 1
+        while True:
+            page = await zep.memory.get_session_messages(
+                session_id, limit=page_size, cursor=cursor
+            )
+            page_messages = page.messages or []
+            messages.extend(
+                Message(
+                    role_type=m.role_type,
+                    role=m.role,
+                    content=m.content,
+                    metadata=m.metadata,
+                )
+                for m in page_messages
+            )
+            if len(page_messages) < page_size or (
+                page.total_count is not None and len(messages) >= page.total_count
+            ):
+                break
+            cursor += 1
+        return cls(pack_messages(messages, **pack_kwargs))
+
+    async def seed(
+        self,
+        zep: AsyncZep,
+        session_id: str,
+        concurrency: int = 1,
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        """Replay the template into `session_id`.
+
+        Zep stores messages in the order it receives them, so batches go out
+        one at a time by default. Raising `concurrency` trades that for
+        speed; the `seq` metadata still records the intended order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        sent = 0
+
+        async def send(batch: SeedBatch):
+            nonlocal sent
+            async with semaphore:
+                await zep.memory.add(session_id=session_id, messages=batch.messages)
+            sent += len(batch.messages)
+            if on_progress is not None:
+                result = on_progress(session_id, sent, self.message_count)
+                if asyncio.iscoroutine(result):
+                    await result
+
+        if concurrency == 1:
+            for batch in self.batches:
+                await send(batch)
+        else:
+            await asyncio.gather(*[send(batch) for batch in self.batches])
+
+    async def seed_many(
+        self,
+        zep: AsyncZep,
+        session_ids: List[str],
+        concurrency: int = 4,
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        """Seed several sessions in parallel, each one in order."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def seed_one(session_id: str):
+            async with semaphore:
+                await self.seed(zep, session_id, on_progress=on_progress)
+
+        await asyncio.gather(*[seed_one(session_id) for session_id in session_ids])
@@ -0,0 +1,129 @@
+""" A pool of pre-provisioned Zep users and sessions.
+
+    Provisioning a chat (user, session, seeded history) takes several round
+    trips. The pool does that ahead of time in the background, so a new
+    chat can take a ready session without waiting. Refills start when the
+    pool drops below `low_water` and top it back up to `high_water`.
+
+    Pooled sessions outlive the process that provisioned them. Before its
+    first refill the pool calls `reclaim` for the sessions a previous run
+    left unused, and `aclose` hands the ones still unused to `release`.
+"""
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReadySession:
+    user_id: str
+    session_id: str
+
+
+class SessionPool:
+    def __init__(
+        self,
+        provision: Callable[[], Awaitable[ReadySession]],
+        low_water: int = 2,
+        high_water: int = 8,
+        concurrency: int = 4,
+        retry_delay: float = 5.0,
+        reclaim: Optional[Callable[[], Awaitable[List[ReadySession]]]] = None,
+        release: Optional[Callable[[ReadySession], Awaitable[None]]] = None,
+    ):
+        if not 0 <= low_water <= high_water:
+            raise ValueError("expected 0 <= low_water <= high_water")
+        self.provision = provision
+        self.low_water = low_water
+        self.high_water = high_water
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.reclaim = reclaim
+        self.release = release
+        self._ready: Deque[ReadySession] = deque()
+        self._provisioning = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._ready)
+
+    def start(self):
+        """Start the background refiller. Safe to call more than once."""
+        if self.high_water == 0:
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._refill())
+
+    def take(self) -> Optional[ReadySession]:
+        """Return a ready session, or None if the pool is empty."""
+        session = self._ready.popleft() if self._ready else None
+        if (
+            self._wakeup is not None
+            and len(self._ready) + self._provisioning < self.low_water
+        ):
+            self._wakeup.set()
+        return session
+
+    async def aclose(self):
+        """Stop refilling and release the sessions nobody has taken."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        ready, self._ready = list(self._ready), deque()
+        if self.release is None:
+            return
+        for session in ready:
+            await self._release(session)
+
+    async def _reclaim(self):
+        try:
+            sessions = await self.reclaim()
+        except Exception as e:
+            logger.error(f"Failed to reclaim pooled sessions: {e}")
+            return
+        for session in sessions:
+            if len(self._ready) < self.high_water or self.release is None:
+                self._ready.append(session)
+            else:
+                await self._release(session)
+
+    async def _release(self, session: ReadySession):
+        try:
+            await self.release(session)
+        except Exception as e:
+            logger.error(f"Failed to release a pooled session: {e}")
+
+    async def _provision_one(self, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            try:
+                self._ready.append(await self.provision())
+                return True
+            except Exception as e:
+                logger.error(f"Failed to provision a pooled session: {e}")
+                return False
+            finally:
+                self._provisioning -= 1
+
+    async def _refill(self):
+        if self.reclaim is not None:
+            await self._reclaim()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            missing = self.high_water - len(self._ready) - self._provisioning
+            if missing > 0:
+                self._provisioning += missing
+                results = await asyncio.gather(
+                    *[self._provision_one(semaphore) for _ in range(missing)]
+                )
+                if not all(results):
+                    await asyncio.sleep(self.retry_delay)
+                continue
+            self._wakeup.clear()
+            await self._wakeup.wait()
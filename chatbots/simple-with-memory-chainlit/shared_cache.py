@@ -0,0 +1,428 @@
+""" Session cache shared between Chainlit worker processes.
+
+    `SharedSessionCache` keeps each worker's in-process `MemoryCache` in
+    front of a shared backend, so a session's memory and facts state read
+    by one worker are warm in every other worker too. Backends:
+
+        memory              no backend, only the local cache (the default)
+        mmap:/path/file     a memory-mapped file shared by workers on a host
+        redis://host:port   any Redis-protocol server
+
+    Entries are versioned. Each session has a version counter in the
+    backend, every entry is stamped with the version that was current
+    before it was loaded, and only entries stamped with the current version
+    are served. A worker's `memory.add` bumps the counter, which invalidates
+    the session everywhere at once, including reads that were in flight.
+    The Redis backend also publishes the bump, so workers drop their local
+    copies without asking; the others check the counter on each read.
+
+    Backend failures never fail a turn: the cache falls back to loading
+    from Zep and logs a warning.
+"""
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from fact_store import FactStore
+from memory_cache import MemoryCache
+from zep_cloud.types import Memory
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "zep-chat:invalidate"
+
+_VERSION = struct.Struct("<q")
+
+
+def _key_hash(key: str) -> int:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class MmapBackend:
+    """Fixed-size hash table in a memory-mapped file.
+
+    Each key maps to one slot, and a colliding key simply replaces the
+    entry. Version counters are a separate array indexed by session hash,
+    so sessions that collide share a counter, which only costs a spurious
+    invalidation. Access is serialized between processes with flock.
+    """
+
+    broadcasts = False
+
+    # key hash, expiry (wall clock, shared between processes), payload length
+    _ENTRY = struct.Struct("<Qdi")
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = 512,
+        slot_size: int = 64 * 1024,
+        version_slots: int = 65536,
+    ):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.version_slots = version_slots
+        self._versions_offset = slots * slot_size
+        size = self._versions_offset + version_slots * 8
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _version_offset(self, session_id: str) -> int:
+        return self._versions_offset + (_key_hash(session_id) % self.version_slots) * 8
+
+    async def start(self, on_invalidate: Callable[[Optional[str]], None]):
+        pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        key_hash = _key_hash(key)
+        offset = (key_hash % self.slots) * self.slot_size
+        with self._locked(fcntl.LOCK_SH):
+            stored_hash, expires, length = self._ENTRY.unpack_from(self._map, offset)
+            if stored_hash != key_hash or expires <= time.time():
+                return None
+            start = offset + self._ENTRY.size
+            return self._map[start : start + length]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.slot_size - self._ENTRY.size:
+            return
+        key_hash = _key_hash(key)
+        offset = (key_hash % self.slots) * self.slot_size
+        start = offset + self._ENTRY.size
+        with self._locked(fcntl.LOCK_EX):
+            self._ENTRY.pack_into(
+                self._map, offset, key_hash, time.time() + ttl, len(value)
+            )
+            self._map[start : start + len(value)] = value
+
+    async def delete(self, keys: List[str]):
+        with self._locked(fcntl.LOCK_EX):
+            for key in keys:
+                key_hash = _key_hash(key)
+                offset = (key_hash % self.slots) * self.slot_size
+                if self._ENTRY.unpack_from(self._map, offset)[0] == key_hash:
+                    self._ENTRY.pack_into(self._map, offset, 0, 0.0, 0)
+
+    async def version(self, session_id: str) -> int:
+        with self._locked(fcntl.LOCK_SH):
+            return _VERSION.unpack_from(self._map, self._version_offset(session_id))[0]
+
+    async def bump(self, session_id: str) -> int:
+        offset = self._version_offset(session_id)
+        with self._locked(fcntl.LOCK_EX):
+            version = _VERSION.unpack_from(self._map, offset)[0] + 1
+            _VERSION.pack_into(self._map, offset, version)
+        return version
+
+    async def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class RespConnection:
+    """A minimal client for the Redis serialization protocol (RESP2)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def send(self, *args):
+        if self._writer is None:
+            await self.connect()
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+
+    async def read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"unexpected reply: {line!r}")
+
+    async def command(self, *args):
+        await self.send(*args)
+        return await self.read_reply()
+
+
+class RedisBackend:
+    broadcasts = True
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = "zep-chat",
+        pool_size: int = 8,
+        reconnect_delay: float = 1.0,
+    ):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.prefix = prefix
+        self.reconnect_delay = reconnect_delay
+        self._pool: asyncio.Queue[RespConnection] = asyncio.Queue()
+        for _ in range(pool_size):
+            self._pool.put_nowait(RespConnection(self.host, self.port))
+        self._subscriber: Optional[asyncio.Task] = None
+
+    async def _command(self, *args):
+        connection = await self._pool.get()
+        try:
+            return await connection.command(*args)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            # reconnect on next use, possibly to a restarted server
+            connection.close()
+            raise
+        except asyncio.CancelledError:
+            # a reply may still be on its way, so it cannot be reused as is
+            connection.close()
+            raise
+        finally:
+            self._pool.put_nowait(connection)
+
+    async def start(self, on_invalidate: Callable[[Optional[str]], None]):
+        if self._subscriber is None:
+            self._subscriber = asyncio.create_task(self._subscribe(on_invalidate))
+
+    async def _subscribe(self, on_invalidate: Callable[[Optional[str]], None]):
+        while True:
+            connection = RespConnection(self.host, self.port)
+            try:
+                await connection.command("SUBSCRIBE", INVALIDATION_CHANNEL)
+                # invalidations may have been missed while disconnected
+                on_invalidate(None)
+                while True:
+                    reply = await connection.read_reply()
+                    if isinstance(reply, list) and reply[0] == b"message":
+                        on_invalidate(reply[2].decode("utf-8"))
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Cache invalidation subscription lost: {e}")
+            finally:
+                connection.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._command("GET", f"{self.prefix}:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._command(
+            "SET", f"{self.prefix}:{key}", value, "PX", max(int(ttl * 1000), 1)
+        )
+
+    async def delete(self, keys: List[str]):
+        await self._command("DEL", *[f"{self.prefix}:{key}" for key in keys])
+
+    async def version(self, session_id: str) -> int:
+        version = await self._command("GET", f"{self.prefix}:version:{session_id}")
+        return int(version or 0)
+
+    async def bump(self, session_id: str) -> int:
+        version = await self._command("INCR", f"{self.prefix}:version:{session_id}")
+        await self._command("PUBLISH", INVALIDATION_CHANNEL, session_id)
+        return version
+
+    async def close(self):
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def create_backend(url: Optional[str]):
+    if not url or url == "memory":
+        return None
+    if url.startswith("mmap:"):
+        return MmapBackend(url[len("mmap:") :])
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown cache backend: {url}")
+
+
+class SharedSessionCache:
+    def __init__(
+        self,
+        backend=None,
+        local: Optional[MemoryCache] = None,
+        facts_ttl: float = 300.0,
+    ):
+        # without a backend this is just the local cache
+        self.backend = backend
+        self.local = local or MemoryCache()
+        self.facts_ttl = facts_ttl
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.backend_errors = 0
+        # session version each local entry was read at, when the backend
+        # cannot tell us about invalidations
+        self._local_versions: Dict[str, int] = {}
+        # backend keys written or read for each session, deleted on discard
+        self._shared_keys: Dict[str, Set[str]] = {}
+        self._started = False
+
+    async def start(self):
+        if self.backend is not None and not self._started:
+            self._started = True
+            await self.backend.start(self._on_invalidate)
+
+    def _on_invalidate(self, session_id: Optional[str]):
+        if session_id is None:
+            self.local.invalidate_all()
+        else:
+            self.local.invalidate(session_id)
+
+    async def _backend_call(self, operation: Awaitable, default=None):
+        try:
+            return await operation
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Shared cache unavailable: {e}")
+            return default
+
+    async def fetch(
+        self,
+        session_id: str,
+        min_rating: Optional[float],
+        load: Callable[[], Awaitable[Memory]],
+    ) -> Memory:
+        if self.backend is None:
+            return await self.local.fetch(session_id, min_rating, load)
+        version = None
+        if not self.backend.broadcasts:
+            version = await self._backend_call(self.backend.version(session_id))
+            if version is not None and version != self._local_versions.get(session_id):
+                self.local.invalidate(session_id)
+
+        memory = self.local.get(session_id, min_rating)
+        if memory is not None:
+            return memory
+
+        if version is None:
+            version = await self._backend_call(self.backend.version(session_id))
+        key = f"memory:{session_id}:{min_rating}"
+        self._shared_keys.setdefault(session_id, set()).add(key)
+        if version is not None:
+            entry = await self._backend_call(self.backend.get(key))
+            if entry and _VERSION.unpack_from(entry)[0] == version:
+                self.shared_hits += 1
+                memory = Memory.parse_raw(entry[_VERSION.size :])
+                self.local.set(session_id, min_rating, memory)
+                self._local_versions[session_id] = version
+                return memory
+            self.shared_misses += 1
+
+        async def load_and_share() -> Memory:
+            loaded = await load()
+            if version is not None:
+                value = _VERSION.pack(version) + loaded.json().encode("utf-8")
+                # expires with the local copy, so Zep is re-read as often
+                await self._backend_call(self.backend.set(key, value, self.local.ttl))
+            return loaded
+
+        memory = await self.local.fetch(session_id, min_rating, load_and_share)
+        if version is not None:
+            self._local_versions[session_id] = version
+        return memory
+
+    async def invalidate(self, session_id: str):
+        self.local.invalidate(session_id)
+        if self.backend is not None:
+            await self._backend_call(self.backend.bump(session_id))
+
+    def stale(self, session_id: str, min_rating: Optional[float]) -> Optional[Memory]:
+        return self.local.stale(session_id, min_rating)
+
+    async def discard(self, session_id: str):
+        """Forget the session, here and in the backend."""
+        self.local.discard(session_id)
+        self._local_versions.pop(session_id, None)
+        keys = self._shared_keys.pop(session_id, set())
+        if self.backend is not None:
+            keys = [*keys, f"facts:{session_id}"]
+            await self._backend_call(self.backend.delete(keys))
+
+    async def load_facts(self, session_id: str) -> Optional[FactStore]:
+        if self.backend is None:
+            return None
+        entry = await self._backend_call(self.backend.get(f"facts:{session_id}"))
+        if not entry:
+            return None
+        return FactStore.from_dict(json.loads(entry))
+
+    async def save_facts(self, session_id: str, store: FactStore):
+        if self.backend is None:
+            return
+        value = json.dumps(store.to_dict()).encode("utf-8")
+        await self._backend_call(
+            self.backend.set(f"facts:{session_id}", value, self.facts_ttl)
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            **self.local.stats(),
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+            "backend_errors": self.backend_errors,
+        }
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
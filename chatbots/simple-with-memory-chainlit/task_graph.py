@@ -0,0 +1,59 @@
+""" A minimal async task graph.
+
+    Each step is a coroutine function with the names of the steps it depends
+    on. Steps start as soon as their dependencies have finished, so
+    independent steps run concurrently. If a step fails, the steps that
+    depend on it fail with the same exception instead of running.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+
+class TaskGraph:
+    def __init__(self):
+        self._steps: Dict[str, Tuple[Callable[[], Awaitable[Any]], List[str]]] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[], Awaitable[Any]],
+        deps: Iterable[str] = (),
+    ):
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self._steps:
+                raise ValueError(f"step {name} depends on unknown step {dep}")
+        if name in self._steps:
+            raise ValueError(f"step {name} is already defined")
+        self._steps[name] = (fn, deps)
+
+    def start(self) -> Dict[str, asyncio.Task]:
+        """Schedule every step and return their tasks by name."""
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(fn, dep_tasks):
+            if dep_tasks:
+                await asyncio.gather(*dep_tasks)
+            return await fn()
+
+        # steps can only depend on earlier steps, so insertion order is a
+        # valid topological order
+        for name, (fn, deps) in self._steps.items():
+            tasks[name] = asyncio.create_task(
+                run_step(fn, [tasks[dep] for dep in deps]), name=name
+            )
+        return tasks
+
+    @staticmethod
+    async def wait(tasks: Dict[str, asyncio.Task]) -> Dict[str, Any]:
+        """Wait for started steps, cancelling the rest if one fails."""
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return dict(zip(tasks.keys(), results))
+
+    async def run(self) -> Dict[str, Any]:
+        return await self.wait(self.start())
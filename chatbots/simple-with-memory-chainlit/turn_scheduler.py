@@ -0,0 +1,116 @@
+""" Per-session ordering of chat turns.
+
+    Chainlit runs `on_message` once per message, concurrently, so a user
+    who sends two messages in quick succession gets two interleaved turns.
+    `TurnScheduler.run` runs one turn per session at a time, in arrival
+    order. With `coalesce` on, messages that arrive while a turn is running
+    are answered together by the next turn: the first of them runs the
+    handler with all of them, and the others return once it has, or raise
+    the same exception if it failed.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(eq=False)
+class _Waiting(Generic[T]):
+    item: T
+    enqueued: float
+    done: asyncio.Future
+
+
+@dataclass
+class _SessionTurns(Generic[T]):
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    waiting: List[_Waiting[T]] = field(default_factory=list)
+
+
+class TurnScheduler(Generic[T]):
+    def __init__(
+        self,
+        coalesce: bool = True,
+        max_coalesce: int = 8,
+        observe_wait: Optional[Callable[[float], None]] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.coalesce = coalesce
+        self.max_coalesce = max_coalesce
+        self.observe_wait = observe_wait
+        self.clock = clock
+        self.turns = 0
+        self.coalesced = 0
+        self._sessions: Dict[str, _SessionTurns[T]] = {}
+
+    def queue_depth(self, session_id: Optional[str] = None) -> int:
+        """Messages waiting for a turn, in one session or in all of them."""
+        if session_id is not None:
+            turns = self._sessions.get(session_id)
+            return len(turns.waiting) if turns else 0
+        return sum(len(t.waiting) for t in self._sessions.values())
+
+    async def run(
+        self,
+        session_id: str,
+        item: T,
+        handler: Callable[[List[T]], Awaitable[None]],
+    ):
+        turns = self._sessions.setdefault(session_id, _SessionTurns())
+        waiting = _Waiting(
+            item, self.clock(), asyncio.get_running_loop().create_future()
+        )
+        turns.waiting.append(waiting)
+        try:
+            async with turns.lock:
+                if waiting.done.done():
+                    # answered, or failed, as part of an earlier turn
+                    return waiting.done.result()
+                batch = self._take_batch(turns, waiting)
+                started = self.clock()
+                if self.observe_wait is not None:
+                    for w in batch:
+                        self.observe_wait(started - w.enqueued)
+                self.turns += 1
+                self.coalesced += len(batch) - 1
+                try:
+                    await handler([w.item for w in batch])
+                except asyncio.CancelledError:
+                    for w in batch:
+                        if w is not waiting:
+                            w.done.cancel()
+                    raise
+                except Exception as e:
+                    # every message coalesced into the turn shares its outcome
+                    for w in batch:
+                        if w is not waiting:
+                            w.done.set_exception(e)
+                    raise
+                for w in batch:
+                    w.done.set_result(None)
+        finally:
+            if waiting in turns.waiting:
+                turns.waiting.remove(waiting)
+            idle = not turns.waiting and not turns.lock.locked()
+            if idle and self._sessions.get(session_id) is turns:
+                del self._sessions[session_id]
+
+    def _take_batch(
+        self, turns: _SessionTurns[T], first: _Waiting[T]
+    ) -> List[_Waiting[T]]:
+        if not self.coalesce:
+            turns.waiting.remove(first)
+            return [first]
+        # the lock is handed out in arrival order, so `first` is the oldest
+        batch = turns.waiting[: self.max_coalesce]
+        del turns.waiting[: self.max_coalesce]
+        return batch
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "turns": self.turns,
+            "coalesced_messages": self.coalesced,
+        }